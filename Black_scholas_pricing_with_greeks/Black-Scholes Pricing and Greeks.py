@@ -1,32 +1,46 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
+from scipy.special import ndtr
 import matplotlib.pyplot as plt
+from options_pricing import INV_SQRT_2PI
 from fetchData import fetchDataIndex, fetchDataOptions  # Your SPX/SPXW data fetcher
 
-# Black-Scholes formula for call and put prices
+# Shared Black-Scholes terms: one d1/d2 evaluation feeds the price and every Greek
+def _bs_core(S, K, T, r, sigma):
+    sqrt_T = np.sqrt(T)
+    v = sigma * sqrt_T
+    drift_term = (r + 0.5 * sigma * sigma) * T
+    d1 = (np.log(S / K) + drift_term) / v
+    d2 = d1 - v
+    nd1 = INV_SQRT_2PI * np.exp(-0.5 * d1 * d1)  # Standard normal PDF
+    disc = np.exp(-r * T)
+    return d1, d2, nd1, disc, v, sqrt_T
+
+# Black-Scholes formula for call and put prices (S, K, T, sigma may be NumPy arrays)
 def black_scholes(S, K, T, r, sigma, option_type="call"):
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    is_call = option_type == "call"
+    d1, d2, nd1, disc, v, sqrt_T = _bs_core(S, K, T, r, sigma)
+    Nd1 = ndtr(d1)
+    Nd2 = ndtr(d2)
+    K_disc = K * disc
     
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    if is_call:
+        price = S * Nd1 - K_disc * Nd2
     else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+        price = K_disc * ndtr(-d2) - S * ndtr(-d1)
     
     # Greeks
-    delta = norm.cdf(d1) if option_type == "call" else norm.cdf(d1) - 1
-    gamma = norm.pdf(d1) / (S * sigma * np.sqrt(T))
-    vega = S * norm.pdf(d1) * np.sqrt(T) * 0.01  # Per 1% IV change
-    theta = (-S * norm.pdf(d1) * sigma / (2 * np.sqrt(T)) - r * K * np.exp(-r * T) * norm.cdf(d2)) / 365  # Daily
+    delta = np.where(is_call, Nd1, Nd1 - 1)
+    gamma = nd1 / (S * v)
+    vega = S * nd1 * sqrt_T * 0.01  # Per 1% IV change
+    theta = (-S * nd1 * sigma / (2 * sqrt_T) - r * K_disc * Nd2) / 365  # Daily
     
     return price, delta, gamma, vega, theta
 
 # Fetch SPX data for May 15, 2024
 trading_day = "2024-05-15"
 expiry_day = "2024-05-31"
-spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-S = spx_df.loc[0, "Open"]  # SPX open price
+S = fetchDataIndex("SPX", trading_day, trading_day)["Open"].iat[0]  # SPX open price
 K = round(S / 50) * 50  # ATM strike
 T = (pd.to_datetime(expiry_day) - pd.to_datetime(trading_day)).days / 365  # Time to expiry
 r = 0.02  # Risk-free rate
@@ -43,11 +57,7 @@ print(f"Put Price: ${put_price:.2f}, Delta: {put_delta:.3f}, Gamma: {put_gamma:.
 
 # Visualize Greeks sensitivity
 S_range = np.linspace(S * 0.9, S * 1.1, 100)  # Stock price range (±10%)
-call_deltas, call_gammas = [], []
-for s in S_range:
-    _, delta, gamma, _, _ = black_scholes(s, K, T, r, sigma, "call")
-    call_deltas.append(delta)
-    call_gammas.append(gamma)
+_, call_deltas, call_gammas, _, _ = black_scholes(S_range, K, T, r, sigma, "call")
 
 plt.figure(figsize=(10, 6))
 plt.plot(S_range, call_deltas, label="Call Delta")
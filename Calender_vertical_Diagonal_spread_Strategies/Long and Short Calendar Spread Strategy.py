@@ -1,19 +1,18 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy.special import ndtr
 
 # Black-Scholes for option pricing
 def black_scholes(S, K, T, r, sigma, option_type="call"):
     """Calculate Black-Scholes option price and delta."""
-    from scipy.stats import norm
     d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
     
     if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
+        price = S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
+        delta = ndtr(d1)
     else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
+        price = K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
+        delta = ndtr(d1) - 1
     
     return price, delta
 
@@ -48,22 +47,23 @@ def calendar_spread_payoff(S, K, T_near, T_far, r, sigma_near, sigma_far, option
 # Filters for trade selection
 def apply_calendar_filters(S, K, T_near, T_far, r, sigma_near, sigma_far, option_type="call"):
     """Apply filters: front-month IV > 30%, expiration gap 14-60 days, delta 0.4-0.6."""
-    _, near_delta = black_scholes(S, K, T_near, r, sigma_near, option_type)
     days_near = T_near * 365
     days_far = T_far * 365
     expiration_gap = days_far - days_near
     
+    # Cheap checks first; the delta is only computed for candidates that survive them
     if sigma_near < 0.3:  # Front-month IV < 30%
         return False, "Front-month IV too low (<30%)"
     if not (14 <= expiration_gap <= 60):
         return False, f"Expiration gap ({expiration_gap:.0f} days) outside [14, 60]"
+    _, near_delta = black_scholes(S, K, T_near, r, sigma_near, option_type)
     if not (0.4 <= near_delta <= 0.6):
         return False, f"Near-month delta ({near_delta:.3f}) outside [0.4, 0.6]"
     
     return True, "Filters passed"
 
 # Main function
-def run_calendar_spread(S=5300, K=5300, T_near=7/365, T_far=30/365, r=0.02, sigma_near=0.35, sigma_far=0.25, option_type="call", strategy="long"):
+def run_calendar_spread(S=5300, K=5300, T_near=7/365, T_far=30/365, r=0.02, sigma_near=0.35, sigma_far=0.25, option_type="call", strategy="long", plot=True):
     """Run calendar spread strategy with filters."""
     # Apply filters
     is_valid, message = apply_calendar_filters(S, K, T_near, T_far, r, sigma_near, sigma_far, option_type)
@@ -84,17 +84,22 @@ def run_calendar_spread(S=5300, K=5300, T_near=7/365, T_far=30/365, r=0.02, sigm
     print(f"Net Cost: ${abs(far_price - near_price):.2f} {'Debit' if strategy == 'long' else 'Credit'}")
     
     # Plot payoff
-    plt.figure(figsize=(10, 6))
-    plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Calendar Spread Payoff")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.axvline(S, color='k', linestyle='--', label="Current Price")
-    plt.title(f"{strategy.capitalize()} {option_type.capitalize()} Calendar Spread Payoff (K=${K}, IV_near={sigma_near*100:.1f}%)")
-    plt.xlabel("Stock Price ($)")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{strategy}_calendar_spread_{option_type}.png")
-    plt.show()
+    if plot:
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=(10, 6))
+        plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Calendar Spread Payoff")
+        plt.axhline(0, color='k', linestyle='--', alpha=0.3)
+        plt.axvline(S, color='k', linestyle='--', label="Current Price")
+        plt.title(f"{strategy.capitalize()} {option_type.capitalize()} Calendar Spread Payoff (K=${K}, IV_near={sigma_near*100:.1f}%)")
+        plt.xlabel("Stock Price ($)")
+        plt.ylabel("Profit/Loss ($)")
+        plt.legend()
+        plt.grid()
+        plt.savefig(f"{strategy}_calendar_spread_{option_type}.png")
+        if plt.get_backend().lower() != "agg":
+            plt.show()
+        plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Long call calendar spread
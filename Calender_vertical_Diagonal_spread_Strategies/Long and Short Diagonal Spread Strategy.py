@@ -1,53 +1,49 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy.special import ndtr
+
+# Shared Black-Scholes terms: one d1/d2 evaluation feeds both price and delta
+def _bs_core(S, K, T, r, sigma):
+    v = sigma * np.sqrt(T)
+    drift_term = (r + 0.5 * sigma * sigma) * T
+    d1 = (np.log(S / K) + drift_term) / v
+    d2 = d1 - v
+    return d1, d2, np.exp(-r * T)
 
 # Black-Scholes for option pricing
 def black_scholes(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price and delta."""
-    from scipy.stats import norm
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    """Calculate Black-Scholes option price and delta (S may be a NumPy array)."""
+    d1, d2, disc = _bs_core(S, K, T, r, sigma)
     
     if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
+        delta = ndtr(d1)
+        price = S * delta - K * disc * ndtr(d2)
     else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
+        price = K * disc * ndtr(-d2) - S * ndtr(-d1)
+        delta = ndtr(d1) - 1
     
     return price, delta
 
 # Diagonal spread payoff calculation
-def diagonal_spread_payoff(S, K_near, K_far, T_near, T_far, r, sigma_near, sigma_far, option_type="call", strategy="long"):
-    """Calculate diagonal spread P/L at near-month expiration."""
-    # Near-month option (sell for long, buy for short)
-    near_price, near_delta = black_scholes(S, K_near, T_near, r, sigma_near, option_type)
-    # Far-month option (buy for long, sell for short)
-    far_price, far_delta = black_scholes(S, K_far, T_far, r, sigma_far, option_type)
+def diagonal_spread_payoff(S, K_far, T_near, T_far, r, sigma_far, near_price, far_price, option_type="call", strategy="long"):
+    """Calculate diagonal spread P/L at near-month expiration from the entry leg prices."""
+    # At near-month expiration, far-month has T_far - T_near time left
+    S_range = np.linspace(S * 0.9, S * 1.1, 100)  # ±10% price range
+    far_remaining, _ = black_scholes(S_range, K_far, T_far - T_near, r, sigma_far, option_type)
     
     # Long: Buy far-month lower strike, sell near-month higher strike (for calls)
     if strategy == "long":
         cost = far_price - near_price
-        S_range = np.linspace(S * 0.9, S * 1.1, 100)  # ±10% price range
-        payoff = np.zeros_like(S_range)
-        for i, s in enumerate(S_range):
-            far_remaining, _ = black_scholes(s, K_far, T_far - T_near, r, sigma_far, option_type)
-            payoff[i] = far_remaining - cost  # Near-month expires
+        payoff = far_remaining - cost  # Near-month expires
     # Short: Sell far-month lower strike, buy near-month higher strike
     else:
         cost = near_price - far_price
-        S_range = np.linspace(S * 0.9, S * 1.1, 100)
-        payoff = np.zeros_like(S_range)
-        for i, s in enumerate(S_range):
-            far_remaining, _ = black_scholes(s, K_far, T_far - T_near, r, sigma_far, option_type)
-            payoff[i] = cost - far_remaining
+        payoff = cost - far_remaining
     
-    return S_range, payoff, near_price, far_price, near_delta, far_delta
+    return S_range, payoff
 
 # Filters for trade selection
-def apply_diagonal_filters(S, K_near, K_far, T_near, T_far, r, sigma_near, sigma_far, option_type="call"):
+def apply_diagonal_filters(near_delta, T_near, T_far, sigma_near):
     """Apply filters: front-month IV > 30%, expiration gap 14-60 days, near-month delta 0.4-0.6."""
-    _, near_delta = black_scholes(S, K_near, T_near, r, sigma_near, option_type)
     days_near = T_near * 365
     days_far = T_far * 365
     expiration_gap = days_far - days_near
@@ -62,17 +58,22 @@ def apply_diagonal_filters(S, K_near, K_far, T_near, T_far, r, sigma_near, sigma
     return True, "Filters passed"
 
 # Main function
-def run_diagonal_spread(S=5300, K_near=5400, K_far=5300, T_near=7/365, T_far=30/365, r=0.02, sigma_near=0.35, sigma_far=0.25, option_type="call", strategy="long"):
+def run_diagonal_spread(S=5300, K_near=5400, K_far=5300, T_near=7/365, T_far=30/365, r=0.02, sigma_near=0.35, sigma_far=0.25, option_type="call", strategy="long", plot=True):
     """Run diagonal spread strategy with filters."""
+    # Price both legs once (near: sell for long, buy for short; far: buy for long, sell for short)
+    (near_price, far_price), (near_delta, far_delta) = black_scholes(
+        S, np.array([K_near, K_far]), np.array([T_near, T_far]), r, np.array([sigma_near, sigma_far]), option_type
+    )
+    
     # Apply filters
-    is_valid, message = apply_diagonal_filters(S, K_near, K_far, T_near, T_far, r, sigma_near, sigma_far, option_type)
+    is_valid, message = apply_diagonal_filters(near_delta, T_near, T_far, sigma_near)
     if not is_valid:
         print(f"Diagonal spread rejected: {message}")
         return
     
     # Calculate payoff
-    S_range, payoff, near_price, far_price, near_delta, far_delta = diagonal_spread_payoff(
-        S, K_near, K_far, T_near, T_far, r, sigma_near, sigma_far, option_type, strategy
+    S_range, payoff = diagonal_spread_payoff(
+        S, K_far, T_near, T_far, r, sigma_far, near_price, far_price, option_type, strategy
     )
     
     # Print details
@@ -83,17 +84,22 @@ def run_diagonal_spread(S=5300, K_near=5400, K_far=5300, T_near=7/365, T_far=30/
     print(f"Net Cost: ${abs(far_price - near_price):.2f} {'Debit' if strategy == 'long' else 'Credit'}")
     
     # Plot payoff
-    plt.figure(figsize=(10, 6))
-    plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Diagonal Spread Payoff")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.axvline(S, color='k', linestyle='--', label="Current Price")
-    plt.title(f"{strategy.capitalize()} {option_type.capitalize()} Diagonal Spread Payoff (K_near=${K_near}, IV_near={sigma_near*100:.1f}%)")
-    plt.xlabel("Stock Price ($)")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{strategy}_diagonal_spread_{option_type}.png")
-    plt.show()
+    if plot:
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=(10, 6))
+        plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Diagonal Spread Payoff")
+        plt.axhline(0, color='k', linestyle='--', alpha=0.3)
+        plt.axvline(S, color='k', linestyle='--', label="Current Price")
+        plt.title(f"{strategy.capitalize()} {option_type.capitalize()} Diagonal Spread Payoff (K_near=${K_near}, IV_near={sigma_near*100:.1f}%)")
+        plt.xlabel("Stock Price ($)")
+        plt.ylabel("Profit/Loss ($)")
+        plt.legend()
+        plt.grid()
+        plt.savefig(f"{strategy}_diagonal_spread_{option_type}.png")
+        if plt.get_backend().lower() != "agg":
+            plt.show()
+        plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Long call diagonal spread
@@ -1,19 +1,26 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy.special import ndtr
+from options_pricing import delta_only
+
+# Shared Black-Scholes terms: one d1/d2 evaluation feeds both price and delta
+def _bs_core(S, K, T, r, sigma):
+    v = sigma * np.sqrt(T)
+    drift_term = (r + 0.5 * sigma * sigma) * T
+    d1 = (np.log(S / K) + drift_term) / v
+    d2 = d1 - v
+    return d1, d2, np.exp(-r * T)
 
 # Black-Scholes for option pricing
 def black_scholes(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price and delta."""
-    from scipy.stats import norm
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    """Calculate Black-Scholes option price and delta (S or K may be NumPy arrays)."""
+    d1, d2, disc = _bs_core(S, K, T, r, sigma)
     
     if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
+        delta = ndtr(d1)
+        price = S * delta - K * disc * ndtr(d2)
     else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
+        price = K * disc * ndtr(-d2) - S * ndtr(-d1)
+        delta = ndtr(d1) - 1
     
     return price, delta
 
@@ -21,8 +28,9 @@ def black_scholes(S, K, T, r, sigma, option_type="call"):
 def vertical_spread_payoff(S, K1, K2, T, r, sigma, option_type="call", strategy="long"):
     """Calculate vertical spread P/L for bull call or bear put spread."""
     # For calls: K1 < K2; for puts: K1 > K2
-    price1, delta1 = black_scholes(S, K1, T, r, sigma, option_type)
-    price2, delta2 = black_scholes(S, K2, T, r, sigma, option_type)
+    prices, deltas = black_scholes(S, np.array([K1, K2]), T, r, sigma, option_type)
+    price1, price2 = prices
+    delta1, delta2 = deltas
     
     # Long bull call: Buy K1 call, sell K2 call; Long bear put: Buy K1 put, sell K2 put
     if strategy == "long":
@@ -46,22 +54,21 @@ def vertical_spread_payoff(S, K1, K2, T, r, sigma, option_type="call", strategy=
 # Filters for trade selection
 def apply_vertical_filters(S, K1, K2, T, r, sigma, option_type="call"):
     """Apply filters: IV > 25%, T in [7, 60] days, delta difference 0.1-0.3."""
-    _, delta1 = black_scholes(S, K1, T, r, sigma, option_type)
-    _, delta2 = black_scholes(S, K2, T, r, sigma, option_type)
     days_to_expiry = T * 365
-    delta_diff = abs(delta1 - delta2)
     
+    # Cheap checks first; deltas are only computed for candidates that survive them
     if sigma < 0.25:  # IV < 25%
         return False, "IV too low (<25%)"
     if not (7 <= days_to_expiry <= 60):
         return False, f"Time to expiry ({days_to_expiry:.0f} days) outside [7, 60]"
+    delta_diff = abs(delta_only(S, K1, T, r, sigma, option_type) - delta_only(S, K2, T, r, sigma, option_type))
     if not (0.1 <= delta_diff <= 0.3):
         return False, f"Delta difference ({delta_diff:.3f}) outside [0.1, 0.3]"
     
     return True, "Filters passed"
 
 # Main function
-def run_vertical_spread(S=5300, K1=5300, K2=5400, T=30/365, r=0.02, sigma=0.30, option_type="call", strategy="long"):
+def run_vertical_spread(S=5300, K1=5300, K2=5400, T=30/365, r=0.02, sigma=0.30, option_type="call", strategy="long", plot=True):
     """Run vertical spread strategy with filters."""
     # Adjust K1, K2 for puts (bear put: K1 > K2)
     if option_type == "put" and K1 < K2:
@@ -86,17 +93,22 @@ def run_vertical_spread(S=5300, K1=5300, K2=5400, T=30/365, r=0.02, sigma=0.30,
     print(f"Net Cost: ${abs(price1 - price2):.2f} {'Debit' if strategy == 'long' else 'Credit'}")
     
     # Plot payoff
-    plt.figure(figsize=(10, 6))
-    plt.plot(S_range, payoff, label=f"{strategy.capitalize()} {spread_type} Payoff")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.axvline(S, color='k', linestyle='--', label="Current Price")
-    plt.title(f"{strategy.capitalize()} {spread_type} Payoff (K1=${K1}, K2=${K2}, IV={sigma*100:.1f}%)")
-    plt.xlabel("Stock Price ($)")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{strategy}_vertical_spread_{option_type}.png")
-    plt.show()
+    if plot:
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=(10, 6))
+        plt.plot(S_range, payoff, label=f"{strategy.capitalize()} {spread_type} Payoff")
+        plt.axhline(0, color='k', linestyle='--', alpha=0.3)
+        plt.axvline(S, color='k', linestyle='--', label="Current Price")
+        plt.title(f"{strategy.capitalize()} {spread_type} Payoff (K1=${K1}, K2=${K2}, IV={sigma*100:.1f}%)")
+        plt.xlabel("Stock Price ($)")
+        plt.ylabel("Profit/Loss ($)")
+        plt.legend()
+        plt.grid()
+        plt.savefig(f"{strategy}_vertical_spread_{option_type}.png")
+        if plt.get_backend().lower() != "agg":
+            plt.show()
+        plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Long bull call spread
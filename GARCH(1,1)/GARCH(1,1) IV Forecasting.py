@@ -1,91 +1,91 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
-from scipy.optimize import brentq
 from arch import arch_model
 import matplotlib.pyplot as plt
+from options_pricing import implied_volatility_vec
 from fetchData import fetchDataIndex, fetchDataOptions
 import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Black-Scholes price function
-def black_scholes_price(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price."""
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return price
-
-# Inverse Black-Scholes to find IV
-def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
-    """Solve for IV using Brent's method."""
-    def objective(sigma):
-        return black_scholes_price(S, K, T, r, sigma, option_type) - market_price
+# Fetch ATM call inputs for a single day
+def _fetch_one_day(day, expiry_day, expiry_np):
+    """Fetch SPX/SPXW data for one day; returns the validated ATM call quote or None."""
+    print(f"Processing {day}")
+    # Fetch SPX data
+    try:
+        S = fetchDataIndex("SPX", day, day)["Open"].iat[0]
+    except Exception as e:
+        print(f"SPX fetch error on {day}: {e}")
+        return None
+    
+    # ATM strike
+    strike = round(S / 50) * 50
+    days_to_expiry = int((expiry_np - np.datetime64(day, "D")).astype(int))
+    T = days_to_expiry / 365.0
+    
+    # Filter: Ensure T is 7-60 days
+    if not (7 <= days_to_expiry <= 60):
+        print(f"Time to expiry ({days_to_expiry} days) outside [7, 60] for {day}")
+        return None
     
+    # Fetch call data
     try:
-        iv = brentq(objective, 0.01, 2.0, xtol=tol)
-        return iv
-    except ValueError:
-        return np.nan
+        ce_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "CE")
+    except Exception as e:
+        print(f"Option fetch error on {day}, strike {strike}: {e}")
+        return None
+    
+    # Use first minute's open price
+    call_price = ce_df["Open"].iat[0] if not ce_df.empty else np.nan
+    
+    # Filter: Ensure price is positive
+    if np.isnan(call_price) or call_price <= 0:
+        print(f"Invalid call price on {day}, strike {strike}: ${call_price}")
+        return None
+    
+    return day, S, strike, T, call_price
 
 # Fetch and calculate daily ATM IV
-def fetch_daily_atm_iv(trading_days, expiry_day, r=0.02):
-    """Fetch SPX/SPXW data and calculate daily ATM call IV."""
-    iv_data = []
-    
-    for day in trading_days:
-        print(f"Processing {day}")
-        # Fetch SPX data
-        try:
-            spx_df = fetchDataIndex("SPX", day, day).reset_index()
-            S = spx_df.loc[0, "Open"]
-        except Exception as e:
-            print(f"SPX fetch error on {day}: {e}")
-            continue
-        
-        # ATM strike
-        strike = round(S / 50) * 50
-        T = (pd.to_datetime(expiry_day) - pd.to_datetime(day)).days / 365
-        
-        # Filter: Ensure T is 7-60 days
-        if not (7 <= T * 365 <= 60):
-            print(f"Time to expiry ({T*365:.0f} days) outside [7, 60] for {day}")
-            continue
-        
-        # Fetch call data
-        try:
-            ce_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "CE").reset_index()
-        except Exception as e:
-            print(f"Option fetch error on {day}, strike {strike}: {e}")
-            continue
-        
-        # Use first minute's open price
-        call_price = ce_df.loc[0, "Open"] if not ce_df.empty else np.nan
-        
-        # Filter: Ensure price is positive
-        if np.isnan(call_price) or call_price <= 0:
-            print(f"Invalid call price on {day}, strike {strike}: ${call_price}")
-            continue
-        
-        # Calculate IV
-        call_iv = implied_volatility(S, strike, T, r, call_price, "call")
-        
-        if not np.isnan(call_iv):
-            iv_data.append({
-                "Date": day,
-                "SPX_Open": S,
-                "Strike": strike,
-                "Call_IV": call_iv * 100,  # In percentage
-                "Time_to_Expiry": T * 365
-            })
+def fetch_daily_atm_iv(trading_days, expiry_day, r=0.02, max_workers=8):
+    """Fetch SPX/SPXW data and calculate daily ATM call IV (days are fetched concurrently)."""
+    quotes = []
+    expiry_np = np.datetime64(expiry_day, "D")  # Converted once, days are subtracted as integers
+    
+    # Pass 1: fetch and validate each day's inputs
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(_fetch_one_day, day, expiry_day, expiry_np): day for day in trading_days}
+        for fut in as_completed(futures):
+            result = fut.result()
+            if result:
+                quotes.append(result)
+    
+    if not quotes:
+        return pd.DataFrame()
+    
+    # Restore trading-day order
+    quotes.sort(key=lambda q: q[0])
+    dates, Ss, Ks, Ts, prices = zip(*quotes)
+    dates = np.array(dates)
+    Ss, Ks, Ts, prices = (np.asarray(col, dtype=float) for col in (Ss, Ks, Ts, prices))
     
-    return pd.DataFrame(iv_data)
+    # Pass 2: solve every day's IV in one batch
+    ivs = implied_volatility_vec(Ss, Ks, Ts, r, prices, is_call=True)
+    ok = ~np.isnan(ivs)
+    
+    return pd.DataFrame({
+        "Date": dates[ok],
+        "SPX_Open": Ss[ok],
+        "Strike": Ks[ok].astype(int),
+        "Call_IV": ivs[ok] * 100,  # In percentage
+        "Time_to_Expiry": Ts[ok] * 365
+    })
 
 # Fit GARCH(1,1) model and forecast IV
-def fit_garch_model(iv_df, forecast_horizon=5):
-    """Fit GARCH(1,1) to IV and forecast future volatility."""
+def fit_garch_model(iv_df, forecast_horizon=5, starting_values=None):
+    """Fit GARCH(1,1) to IV and forecast future volatility.
+
+    Pass the previous fit's ``garch_fit.params`` as ``starting_values`` to warm-start rolling-window refits.
+    """
     # Prepare IV returns (log differences for stationarity)
     iv_series = iv_df["Call_IV"].values
     iv_returns = 100 * np.diff(np.log(iv_series))  # Percentage log returns
@@ -96,9 +96,13 @@ def fit_garch_model(iv_df, forecast_horizon=5):
         return None
     
     # Fit GARCH(1,1)
-    model = arch_model(iv_returns, vol="Garch", p=1, q=1, mean="Zero")
+    model = arch_model(iv_returns, vol="Garch", p=1, q=1, mean="Zero", rescale=False)
+    if starting_values is None:
+        starting_values = np.array([np.var(iv_returns) * 0.05, 0.1, 0.85])  # omega, alpha, beta
     try:
-        garch_fit = model.fit(disp="off")
+        # Short IV series converge quickly; cap the optimizer instead of running to the default limit
+        garch_fit = model.fit(disp="off", update_freq=0, show_warning=False,
+                              starting_values=starting_values, options={"maxiter": 50})
     except Exception as e:
         print(f"GARCH fitting error: {e}")
         return None
@@ -145,27 +149,28 @@ if __name__ == "__main__":
         else:
             forecast_iv, ci_lower, ci_upper, garch_fit = garch_result
             
-            # Prepare forecast DataFrame
+            # Combine historical and forecast data in one frame (NaN where a column does not apply)
             forecast_dates = [iv_df["Date"].iloc[-1] + datetime.timedelta(days=i) for i in range(1, forecast_horizon + 1)]
-            forecast_df = pd.DataFrame({
-                "Date": forecast_dates,
-                "Forecast_IV": forecast_iv,
-                "CI_Lower": ci_lower,
-                "CI_Upper": ci_upper
+            hist_nan = np.full(len(iv_df), np.nan)
+            forecast_nan = np.full(forecast_horizon, np.nan)
+            combined_df = pd.DataFrame({
+                "Date": np.concatenate([iv_df["Date"].to_numpy(dtype=object), np.array(forecast_dates, dtype=object)]),
+                **{col: np.concatenate([iv_df[col].to_numpy(dtype=float), forecast_nan])
+                   for col in ["SPX_Open", "Strike", "Call_IV", "Time_to_Expiry"]},
+                "Forecast_IV": np.concatenate([hist_nan, forecast_iv]),
+                "CI_Lower": np.concatenate([hist_nan, ci_lower]),
+                "CI_Upper": np.concatenate([hist_nan, ci_upper])
             })
             
-            # Combine historical and forecast data
-            combined_df = pd.concat([iv_df, forecast_df], ignore_index=True)
-            
             # Export to Excel
-            combined_df.to_excel("spxw_garch_iv_forecast.xlsx", index=False)
+            combined_df.to_excel("spxw_garch_iv_forecast.xlsx", index=False, engine="xlsxwriter")
             print("GARCH forecast exported to spxw_garch_iv_forecast.xlsx")
             
             # Visualize historical and forecasted IV
             plt.figure(figsize=(12, 6))
             plt.plot(iv_df["Date"], iv_df["Call_IV"], marker="o", label="Historical Call IV")
-            plt.plot(forecast_df["Date"], forecast_df["Forecast_IV"], marker="s", label="Forecasted IV")
-            plt.fill_between(forecast_df["Date"], forecast_df["CI_Lower"], forecast_df["CI_Upper"], alpha=0.2, label="95% CI")
+            plt.plot(forecast_dates, forecast_iv, marker="s", label="Forecasted IV")
+            plt.fill_between(forecast_dates, ci_lower, ci_upper, alpha=0.2, label="95% CI")
             plt.title(f"SPXW ATM Call IV with GARCH(1,1) Forecast ({trading_days[0]} to {forecast_dates[-1]})")
             plt.xlabel("Date")
             plt.ylabel("Implied Volatility (%)")
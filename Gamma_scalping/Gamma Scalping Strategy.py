@@ -1,24 +1,70 @@
+import math
 import numpy as np
-import matplotlib.pyplot as plt
+from numba import njit, prange
+from options_pricing import INV_SQRT_2PI
+
+# Standard normal CDF/PDF (erfc form keeps precision in the lower tail)
+@njit(cache=True, fastmath=True)
+def _ndtr(x):
+    return 0.5 * math.erfc(-x * 0.7071067811865476)
+
+@njit(cache=True, fastmath=True)
+def _ndpdf(x):
+    return INV_SQRT_2PI * math.exp(-0.5 * x * x)
 
 # Black-Scholes for option pricing and Greeks
+@njit(cache=True, fastmath=True)
 def black_scholes_greeks(S, K, T, r, sigma, option_type="call"):
     """Calculate Black-Scholes price, delta, and gamma."""
-    from scipy.stats import norm
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
+    sqrt_T = math.sqrt(T)
+    d1 = (math.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
     
     if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
+        price = S * _ndtr(d1) - K * math.exp(-r * T) * _ndtr(d2)
+        delta = _ndtr(d1)
     else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
+        price = K * math.exp(-r * T) * _ndtr(-d2) - S * _ndtr(-d1)
+        delta = _ndtr(d1) - 1
     
-    gamma = norm.pdf(d1) / (S * sigma * np.sqrt(T))
+    gamma = _ndpdf(d1) / (S * sigma * sqrt_T)
     
     return price, delta, gamma
 
+# Delta only (skips the price and gamma terms) for the trade filters
+@njit(cache=True, fastmath=True)
+def _delta_only(S, K, T, r, sigma, is_call):
+    d1 = (math.log(S / K) + (r + 0.5 * sigma * sigma) * T) / (sigma * math.sqrt(T))
+    return _ndtr(d1) if is_call else _ndtr(d1) - 1.0
+
+# Delta-hedging loop over the price path
+@njit(cache=True)
+def _gamma_scalp_loop(K, T, r, sigma, times, price_path, call_delta, put_delta):
+    """Re-hedge the straddle delta at each step; returns stock position, cash P/L and last deltas."""
+    total_delta = call_delta + put_delta
+    stock_position = 0.0
+    cumulative_profit = 0.0
+    
+    for i in range(min(len(times), len(price_path))):
+        # Update Greeks
+        S_t = price_path[i]
+        T_remaining = T - times[i]
+        if T_remaining <= 0:
+            break
+        _, call_delta, _ = black_scholes_greeks(S_t, K, T_remaining, r, sigma, "call")
+        _, put_delta, _ = black_scholes_greeks(S_t, K, T_remaining, r, sigma, "put")
+        new_delta = call_delta + put_delta
+        
+        # Hedge: Adjust stock position to neutralize delta
+        stock_trade = -(new_delta - total_delta)  # Buy/sell stocks to offset
+        stock_position += stock_trade
+        cumulative_profit -= stock_trade * S_t
+        
+        # Update total delta
+        total_delta = new_delta
+    
+    return stock_position, cumulative_profit, call_delta, put_delta
+
 # Gamma scalping simulation
 def gamma_scalping(S, K, T, r, sigma, price_path, hedge_interval=0.01):
     """Simulate gamma scalping on a long straddle."""
@@ -27,33 +73,14 @@ def gamma_scalping(S, K, T, r, sigma, price_path, hedge_interval=0.01):
     
     # Initial straddle: Buy call + put
     initial_cost = call_price + put_price
-    total_delta = call_delta + put_delta  # Near zero for ATM straddle
     total_gamma = call_gamma + put_gamma
     
     # Simulate price path (input or generated)
     times = np.arange(0, T, hedge_interval)
-    profits = []
-    stock_position = 0
-    cumulative_profit = 0
-    
-    for t, S_t in zip(times, price_path):
-        # Update Greeks
-        T_remaining = T - t
-        if T_remaining <= 0:
-            break
-        _, call_delta, call_gamma = black_scholes_greeks(S_t, K, T_remaining, r, sigma, "call")
-        _, put_delta, put_gamma = black_scholes_greeks(S_t, K, T_remaining, r, sigma, "put")
-        new_delta = call_delta + put_delta
-        
-        # Hedge: Adjust stock position to neutralize delta
-        delta_change = new_delta - total_delta
-        stock_trade = -delta_change  # Buy/sell stocks to offset
-        stock_position += stock_trade
-        trade_cost = stock_trade * S_t
-        cumulative_profit -= trade_cost
-        
-        # Update total delta
-        total_delta = new_delta
+    price_path = np.asarray(price_path, dtype=np.float64)
+    stock_position, cumulative_profit, call_delta, put_delta = _gamma_scalp_loop(
+        K, T, r, sigma, times, price_path, call_delta, put_delta
+    )
     
     # At expiration: Close straddle and stock position
     final_payoff = max(price_path[-1] - K, 0) + max(K - price_path[-1], 0) - initial_cost
@@ -62,23 +89,56 @@ def gamma_scalping(S, K, T, r, sigma, price_path, hedge_interval=0.01):
     
     return times, [cumulative_profit] * len(times), call_price, put_price, call_delta, put_delta, total_gamma
 
+# Re-hedge many price paths in parallel
+@njit(parallel=True, cache=True)
+def _gamma_scalp_paths(K, T, r, sigma, times, price_paths, call_delta, put_delta):
+    """Run _gamma_scalp_loop over each row of price_paths; returns stock positions and cash P/L."""
+    n_paths = price_paths.shape[0]
+    stock_positions = np.empty(n_paths)
+    cash_profits = np.empty(n_paths)
+    for i in prange(n_paths):
+        stock_position, cumulative_profit, _, _ = _gamma_scalp_loop(
+            K, T, r, sigma, times, price_paths[i], call_delta, put_delta
+        )
+        stock_positions[i] = stock_position
+        cash_profits[i] = cumulative_profit
+    return stock_positions, cash_profits
+
+# Monte Carlo gamma scalping over synthetic paths
+def gamma_scalping_mc(S, K, T, r, sigma, n_paths, hedge_interval=0.01, rng=None):
+    """Simulate gamma scalping on n_paths GBM paths; returns the final profit of each path."""
+    if rng is None:
+        rng = np.random.default_rng(42)
+    call_price, call_delta, _ = black_scholes_greeks(S, K, T, r, sigma, "call")
+    put_price, put_delta, _ = black_scholes_greeks(S, K, T, r, sigma, "put")
+    
+    times = np.arange(0, T, hedge_interval)
+    Z = rng.standard_normal((n_paths, len(times)))
+    price_paths = S * np.exp((r - 0.5 * sigma**2) * times + sigma * np.sqrt(hedge_interval) * np.cumsum(Z, axis=1))
+    stock_positions, cash_profits = _gamma_scalp_paths(K, T, r, sigma, times, price_paths, call_delta, put_delta)
+    
+    # At expiration: Close straddle and stock position
+    S_T = price_paths[:, -1]
+    final_payoff = np.maximum(S_T - K, 0) + np.maximum(K - S_T, 0) - (call_price + put_price)
+    return cash_profits + final_payoff - stock_positions * S_T
+
 # Filters for trade selection
 def apply_gamma_scalping_filters(S, K, T, r, sigma):
     """Apply filters: IV > 30%, T in [7, 30] days, delta in [0.4, 0.6]."""
-    _, call_delta, _ = black_scholes_greeks(S, K, T, r, sigma, "call")
     days_to_expiry = T * 365
     
     if sigma < 0.30:  # IV < 30%
         return False, "IV too low (<30%)"
     if not (7 <= days_to_expiry <= 30):
         return False, f"Time to expiry ({days_to_expiry:.0f} days) outside [7, 30]"
+    call_delta = _delta_only(S, K, T, r, sigma, True)
     if not (0.4 <= call_delta <= 0.6):
         return False, f"Call delta ({call_delta:.3f}) outside [0.4, 0.6]"
     
     return True, "Filters passed"
 
 # Main function
-def run_gamma_scalping(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, hedge_interval=0.01):
+def run_gamma_scalping(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, hedge_interval=0.01, rng=None, plot=True):
     """Run gamma scalping strategy with filters."""
     # Apply filters
     is_valid, message = apply_gamma_scalping_filters(S, K, T, r, sigma)
@@ -87,9 +147,11 @@ def run_gamma_scalping(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, hedge_inter
         return
     
     # Generate synthetic price path (replace with real data later)
-    np.random.seed(42)
+    if rng is None:
+        rng = np.random.default_rng(42)
     times = np.arange(0, T, hedge_interval)
-    price_path = S * np.exp((r - 0.5 * sigma**2) * times + sigma * np.sqrt(hedge_interval) * np.cumsum(np.random.randn(len(times))))
+    Z = rng.standard_normal(len(times))
+    price_path = S * np.exp((r - 0.5 * sigma**2) * times + sigma * np.sqrt(hedge_interval) * np.cumsum(Z))
     
     # Run simulation
     times, profits, call_price, put_price, call_delta, put_delta, total_gamma = gamma_scalping(
@@ -104,16 +166,21 @@ def run_gamma_scalping(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, hedge_inter
     print(f"Final Profit: ${profits[-1]:.2f}")
     
     # Plot cumulative profit
-    plt.figure(figsize=(10, 6))
-    plt.plot(times * 365, profits, label="Cumulative Profit")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.title(f"Gamma Scalping Profit (K=${K}, IV={sigma*100:.1f}%)")
-    plt.xlabel("Days")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig("gamma_scalping_profit.png")
-    plt.show()
+    if plot:
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=(10, 6))
+        plt.plot(times * 365, profits, label="Cumulative Profit")
+        plt.axhline(0, color='k', linestyle='--', alpha=0.3)
+        plt.title(f"Gamma Scalping Profit (K=${K}, IV={sigma*100:.1f}%)")
+        plt.xlabel("Days")
+        plt.ylabel("Profit/Loss ($)")
+        plt.legend()
+        plt.grid()
+        plt.savefig("gamma_scalping_profit.png")
+        if plt.get_backend().lower() != "agg":
+            plt.show()
+        plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Gamma scalping
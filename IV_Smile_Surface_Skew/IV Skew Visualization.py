@@ -1,92 +1,68 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
-from scipy.optimize import brentq
 import matplotlib.pyplot as plt
-from fetchData import fetchDataIndex, fetchDataOptions
+from options_pricing import implied_volatility_vec
+from fetchData import fetchDataIndex, fetchDataOptionsChain
 import datetime
 
-# Black-Scholes price function
-def black_scholes_price(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price."""
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return price
-
-# Inverse Black-Scholes to find IV
-def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
-    """Solve for IV using Brent's method."""
-    def objective(sigma):
-        return black_scholes_price(S, K, T, r, sigma, option_type) - market_price
-    
-    try:
-        iv = brentq(objective, 0.01, 2.0, xtol=tol)
-        return iv
-    except ValueError:
-        return np.nan
-
 # Fetch and calculate IV skew
-def calculate_iv_skew(trading_day, expiry_day, strikes, r=0.02):
+def calculate_iv_skew(trading_day, expiry_day, strikes, r=0.02, S=None):
     """Calculate IV skew as IV difference from ATM."""
-    # Fetch SPX data
-    try:
-        spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-        S = spx_df.loc[0, "Open"]
-    except Exception as e:
-        print(f"SPX fetch error on {trading_day}: {e}")
-        return None
+    if S is None:
+        # Fetch SPX data (skipped when the caller already has the open)
+        try:
+            S = fetchDataIndex("SPX", trading_day, trading_day)["Open"].iat[0]
+        except Exception as e:
+            print(f"SPX fetch error on {trading_day}: {e}")
+            return None
     
     # ATM strike
     atm_strike = round(S / 50) * 50
-    T = (pd.to_datetime(expiry_day) - pd.to_datetime(trading_day)).days / 365
+    days_to_expiry = int((np.datetime64(expiry_day, "D") - np.datetime64(trading_day, "D")).astype(int))
+    T = days_to_expiry / 365.0
     
     # Filter: Ensure T is 7-60 days
-    if not (7 <= T * 365 <= 60):
-        print(f"Time to expiry ({T*365:.0f} days) outside [7, 60]")
+    if not (7 <= days_to_expiry <= 60):
+        print(f"Time to expiry ({days_to_expiry} days) outside [7, 60]")
         return None
     
-    skew_data = []
-    atm_call_iv = atm_put_iv = np.nan
+    # Fetch call and put chains (one query per side)
+    try:
+        ce_chain = fetchDataOptionsChain("SPXW", trading_day, trading_day, list(strikes), expiry_day, "CE")
+        pe_chain = fetchDataOptionsChain("SPXW", trading_day, trading_day, list(strikes), expiry_day, "PE")
+    except Exception as e:
+        print(f"Option chain fetch error on {trading_day}: {e}")
+        return None
     
-    for strike in strikes:
-        # Fetch call and put data
-        try:
-            ce_df = fetchDataOptions("SPXW", trading_day, trading_day, strike, expiry_day, "CE").reset_index()
-            pe_df = fetchDataOptions("SPXW", trading_day, trading_day, strike, expiry_day, "PE").reset_index()
-        except Exception as e:
-            print(f"Option fetch error for strike {strike}: {e}")
-            continue
-        
-        # Use first minute's open price
-        call_price = ce_df.loc[0, "Open"] if not ce_df.empty else np.nan
-        put_price = pe_df.loc[0, "Open"] if not pe_df.empty else np.nan
-        
-        # Filter: Ensure prices are positive
-        if np.isnan(call_price) or call_price <= 0 or np.isnan(put_price) or put_price <= 0:
-            print(f"Invalid prices for strike {strike}: Call=${call_price}, Put=${put_price}")
-            continue
-        
-        # Calculate IV
-        call_iv = implied_volatility(S, strike, T, r, call_price, "call")
-        put_iv = implied_volatility(S, strike, T, r, put_price, "put")
-        
-        if strike == atm_strike:
-            atm_call_iv = call_iv * 100 if not np.isnan(call_iv) else np.nan
-            atm_put_iv = put_iv * 100 if not np.isnan(put_iv) else np.nan
-        
-        skew_data.append({
-            "Strike": strike,
-            "Call_IV": call_iv * 100 if not np.isnan(call_iv) else np.nan,
-            "Put_IV": put_iv * 100 if not np.isnan(put_iv) else np.nan,
-            "Call_Skew": (call_iv * 100 - atm_call_iv) if not np.isnan(call_iv) and not np.isnan(atm_call_iv) else np.nan,
-            "Put_Skew": (put_iv * 100 - atm_put_iv) if not np.isnan(put_iv) and not np.isnan(atm_put_iv) else np.nan
-        })
+    # Strike-aligned price arrays (first minute's open price)
+    strikes_arr = np.asarray(strikes)
+    call_px = ce_chain.groupby("Strike").first()["Open"].reindex(strikes_arr).to_numpy(dtype=float)
+    put_px = pe_chain.groupby("Strike").first()["Open"].reindex(strikes_arr).to_numpy(dtype=float)
+    
+    # Filter: Ensure prices are positive (invalid strikes are NaN until dropped below)
+    invalid = ~((call_px > 0) & (put_px > 0))
+    for strike, call_price, put_price in zip(strikes_arr[invalid], call_px[invalid], put_px[invalid]):
+        print(f"Invalid prices for strike {strike}: Call=${call_price}, Put=${put_price}")
+    call_px = np.where(invalid, np.nan, call_px)
+    put_px = np.where(invalid, np.nan, put_px)
+    
+    # Calculate IV for all strikes at once
+    call_iv = implied_volatility_vec(S, strikes_arr, T, r, call_px, is_call=True) * 100
+    put_iv = implied_volatility_vec(S, strikes_arr, T, r, put_px, is_call=False) * 100
+    
+    # Skew relative to the ATM strike (NaN if ATM is missing)
+    is_atm = strikes_arr == atm_strike
+    atm_call_iv = call_iv[is_atm][0] if is_atm.any() else np.nan
+    atm_put_iv = put_iv[is_atm][0] if is_atm.any() else np.nan
     
-    return pd.DataFrame(skew_data)
+    # Strikes without valid quotes are dropped, so a chain with no quotes gives an empty frame
+    return pd.DataFrame({
+        "Strike": strikes_arr,
+        "Call_IV": call_iv,
+        "Put_IV": put_iv,
+        "Call_Skew": call_iv - atm_call_iv,
+        "Put_Skew": put_iv - atm_put_iv
+    })[~invalid].reset_index(drop=True)
 
 # Main execution
 if __name__ == "__main__":
@@ -94,13 +70,12 @@ if __name__ == "__main__":
     expiry_day = datetime.date(2024, 5, 31)
     
     # Define strikes (±200 points from ATM, step=50)
-    spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-    S = spx_df.loc[0, "Open"]
+    S = fetchDataIndex("SPX", trading_day, trading_day)["Open"].iat[0]
     atm_strike = round(S / 50) * 50
     strikes = np.arange(atm_strike - 200, atm_strike + 201, 50)
     
     # Calculate IV skew
-    skew_df = calculate_iv_skew(trading_day, expiry_day, strikes)
+    skew_df = calculate_iv_skew(trading_day, expiry_day, strikes, S=S)
     
     if skew_df is None or skew_df.empty:
         print("No valid skew data calculated.")
@@ -1,46 +1,22 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
-from scipy.optimize import brentq
 import plotly.graph_objects as go
-from fetchData import fetchDataIndex, fetchDataOptions
+from options_pricing import implied_volatility_vec
+from fetchData import fetchDataIndex, fetchDataOptionsBatch
 import datetime
 
-# Black-Scholes price function
-def black_scholes_price(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price."""
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return price
-
-# Inverse Black-Scholes to find IV
-def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
-    """Solve for IV using Brent's method."""
-    def objective(sigma):
-        return black_scholes_price(S, K, T, r, sigma, option_type) - market_price
-    
-    try:
-        iv = brentq(objective, 0.01, 2.0, xtol=tol)
-        return iv
-    except ValueError:
-        return np.nan
-
 # Fetch and calculate IV surface
-def calculate_iv_surface(trading_day, expiry_days, strikes, r=0.02):
+def calculate_iv_surface(trading_day, expiry_days, strikes, r=0.02, S=None):
     """Calculate IV surface across strikes and expirations."""
-    # Fetch SPX data
-    try:
-        spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-        S = spx_df.loc[0, "Open"]
-    except Exception as e:
-        print(f"SPX fetch error on {trading_day}: {e}")
-        return None
+    if S is None:
+        # Fetch SPX data (skipped when the caller already has the open)
+        try:
+            S = fetchDataIndex("SPX", trading_day, trading_day)["Open"].iat[0]
+        except Exception as e:
+            print(f"SPX fetch error on {trading_day}: {e}")
+            return None
     
-    surface_data = []
+    expiries = []
     for expiry_day in expiry_days:
         # Time to expiration
         T = (pd.to_datetime(expiry_day) - pd.to_datetime(trading_day)).days / 365
@@ -49,34 +25,55 @@ def calculate_iv_surface(trading_day, expiry_days, strikes, r=0.02):
         if not (7 <= T * 365 <= 180):
             print(f"Time to expiry ({T*365:.0f} days) outside [7, 180] for {expiry_day}")
             continue
-        
+        expiries.append((expiry_day, T))
+    
+    if not expiries:
+        return pd.DataFrame()
+    
+    # Fetch call data for every strike/expiry in one query (use calls for simplicity)
+    try:
+        batch_df = fetchDataOptionsBatch("SPXW", trading_day, trading_day, list(strikes), [e for e, _ in expiries], ["CE"])
+    except Exception as e:
+        print(f"Option fetch error on {trading_day}: {e}")
+        return pd.DataFrame()
+    first_open = batch_df.groupby(["Strike", "Expiry", "OptionType"])["Open"].first()
+    
+    # Output columns preallocated for the full grid, trimmed to the valid quotes
+    n = len(strikes) * len(expiries)
+    strike_out = np.empty(n, dtype=np.asarray(strikes).dtype)
+    expiry_out = np.empty(n, dtype=object)
+    T_out = np.empty(n)
+    price_out = np.empty(n)
+    i = 0
+    for expiry_day, T in expiries:
+        expiry_key = pd.Timestamp(expiry_day)
         for strike in strikes:
-            # Fetch call data (use calls for simplicity)
-            try:
-                ce_df = fetchDataOptions("SPXW", trading_day, trading_day, strike, expiry_day, "CE").reset_index()
-            except Exception as e:
-                print(f"Option fetch error for strike {strike}, expiry {expiry_day}: {e}")
-                continue
-            
             # Use first minute's open price
-            call_price = ce_df.loc[0, "Open"] if not ce_df.empty else np.nan
+            call_price = first_open.get((strike, expiry_key, "CE"), np.nan)
             
             # Filter: Ensure price is positive
             if np.isnan(call_price) or call_price <= 0:
                 print(f"Invalid call price for strike {strike}, expiry {expiry_day}: ${call_price}")
                 continue
             
-            # Calculate IV
-            call_iv = implied_volatility(S, strike, T, r, call_price, "call")
-            
-            surface_data.append({
-                "Strike": strike,
-                "Expiry": expiry_day,
-                "Days_to_Expiry": T * 365,
-                "Call_IV": call_iv * 100 if not np.isnan(call_iv) else np.nan
-            })
+            strike_out[i] = strike
+            expiry_out[i] = expiry_day
+            T_out[i] = T
+            price_out[i] = call_price
+            i += 1
+    
+    if i == 0:
+        return pd.DataFrame()
+    
+    # Calculate IV for the whole strike/expiry grid in one solve
+    call_iv = implied_volatility_vec(S, strike_out[:i], T_out[:i], r, price_out[:i], is_call=True)
     
-    return pd.DataFrame(surface_data)
+    return pd.DataFrame({
+        "Strike": strike_out[:i],
+        "Expiry": expiry_out[:i],
+        "Days_to_Expiry": T_out[:i] * 365,
+        "Call_IV": call_iv * 100
+    })
 
 # Main execution
 if __name__ == "__main__":
@@ -88,13 +85,12 @@ if __name__ == "__main__":
     ]
     
     # Define strikes (±200 points from ATM, step=50)
-    spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-    S = spx_df.loc[0, "Open"]
+    S = fetchDataIndex("SPX", trading_day, trading_day)["Open"].iat[0]
     atm_strike = round(S / 50) * 50
     strikes = np.arange(atm_strike - 200, atm_strike + 201, 50)
     
     # Calculate IV surface
-    surface_df = calculate_iv_surface(trading_day, expiry_days, strikes)
+    surface_df = calculate_iv_surface(trading_day, expiry_days, strikes, S=S)
     
     if surface_df is None or surface_df.empty:
         print("No valid surface data calculated.")
@@ -1,89 +1,91 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
-from scipy.optimize import brentq
 import matplotlib.pyplot as plt
-from fetchData import fetchDataIndex, fetchDataOptions
+from options_pricing import implied_volatility_vec
+from fetchData import fetchDataIndex, fetchDataOptionsBatch
 import datetime
 
-# Black-Scholes price function
-def black_scholes_price(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price."""
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return price
-
-# Inverse Black-Scholes to find IV
-def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
-    """Solve for IV using Brent's method."""
-    def objective(sigma):
-        return black_scholes_price(S, K, T, r, sigma, option_type) - market_price
-    
-    try:
-        # Bound IV between 1% and 200%
-        iv = brentq(objective, 0.01, 2.0, xtol=tol)
-        return iv
-    except ValueError:
-        return np.nan  # Return NaN if no solution found
-
 # Fetch and process SPX/SPXW data
 def fetch_and_calculate_iv(trading_days, expiry_day, strike=None, r=0.02):
     """Fetch SPX/SPXW data and calculate IV for ATM options."""
-    iv_data = []
+    # Fetch SPX once for the whole range; the first bar of each day is its open
+    try:
+        spx_df = fetchDataIndex("SPX", min(trading_days), max(trading_days))
+    except Exception as e:
+        print(f"SPX fetch error for {min(trading_days)} to {max(trading_days)}: {e}")
+        return pd.DataFrame()
+    spx_open = spx_df.groupby(spx_df.index.date)["Open"].first()
     
+    days = []
     for day in trading_days:
-        print(f"Processing {day}")
-        # Fetch SPX data
-        try:
-            spx_df = fetchDataIndex("SPX", day, day).reset_index()
-        except Exception as e:
-            print(f"SPX fetch error on {day}: {e}")
+        S = spx_open.get(pd.Timestamp(day).date(), np.nan)  # Use open price
+        if np.isnan(S):
+            print(f"SPX data missing on {day}")
             continue
-        
-        # Determine ATM strike
-        S = spx_df.loc[0, "Open"]  # Use open price
-        if strike is None:
-            strike = round(S / 50) * 50  # Nearest 50-point strike
-        
+        days.append((day, S))
+    
+    if not days:
+        return pd.DataFrame()
+    
+    # Determine ATM strike
+    if strike is None:
+        strike = round(days[0][1] / 50) * 50  # Nearest 50-point strike
+    
+    # Fetch call and put data for every day in one query
+    try:
+        batch_df = fetchDataOptionsBatch("SPXW", min(trading_days), max(trading_days), [strike], [expiry_day], ["CE", "PE"])
+    except Exception as e:
+        print(f"Option fetch error for {min(trading_days)} to {max(trading_days)}: {e}")
+        return pd.DataFrame()
+    first_open = batch_df.groupby([batch_df.index.date, "OptionType"])["Open"].first()
+    
+    # Output columns preallocated per day (prices row 0: calls, row 1: puts), trimmed to the valid quotes
+    n = len(days)
+    day_out = np.empty(n, dtype=object)
+    S_out = np.empty(n)
+    T_out = np.empty(n)
+    price_out = np.empty((2, n))
+    i = 0
+    for day, S in days:
+        print(f"Processing {day}")
         # Time to expiration
         T = (pd.to_datetime(expiry_day) - pd.to_datetime(day)).days / 365
         
-        # Fetch option data
-        try:
-            ce_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "CE").reset_index()
-            pe_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "PE").reset_index()
-        except Exception as e:
-            print(f"Option fetch error on {day}: {e}")
-            continue
-        
         # Use first minute's option prices (open)
-        call_price = ce_df.loc[0, "Open"] if not ce_df.empty else np.nan
-        put_price = pe_df.loc[0, "Open"] if not pe_df.empty else np.nan
-        
-        # Calculate IV
-        call_iv = implied_volatility(S, strike, T, r, call_price, "call") if not np.isnan(call_price) else np.nan
-        put_iv = implied_volatility(S, strike, T, r, put_price, "put") if not np.isnan(put_price) else np.nan
+        day_key = pd.Timestamp(day).date()
+        call_price = first_open.get((day_key, "CE"), np.nan)
+        put_price = first_open.get((day_key, "PE"), np.nan)
+        # A day with one leg missing keeps its row (NaN IV for that leg); only a day with no quotes at all is skipped
+        if np.isnan(call_price) and np.isnan(put_price):
+            print(f"Option data missing on {day}")
+            continue
         
-        iv_data.append({
-            "Date": day,
-            "SPX_Open": S,
-            "Strike": strike,
-            "Call_IV": call_iv * 100,  # Convert to percentage
-            "Put_IV": put_iv * 100,
-            "Time_to_Expiry": T
-        })
+        day_out[i] = day
+        S_out[i] = S
+        T_out[i] = T
+        price_out[:, i] = call_price, put_price
+        i += 1
+    
+    if i == 0:
+        return pd.DataFrame()
+    
+    # Calculate call and put IVs for every day in one solve
+    ivs = implied_volatility_vec(S_out[:i], strike, T_out[:i], r, price_out[:, :i], is_call=np.array([[True], [False]]))
     
-    return pd.DataFrame(iv_data)
+    return pd.DataFrame({
+        "Date": day_out[:i],
+        "SPX_Open": S_out[:i],
+        "Strike": np.full(i, strike),
+        "Call_IV": ivs[0] * 100,  # Convert to percentage
+        "Put_IV": ivs[1] * 100,
+        "Time_to_Expiry": T_out[:i]
+    })
 
 # Forecast IV using EMA
 def forecast_iv(iv_df, span=5):
     """Apply EMA to forecast IV for calls and puts."""
-    iv_df["Call_IV_EMA"] = iv_df["Call_IV"].ewm(span=span, adjust=False).mean()
-    iv_df["Put_IV_EMA"] = iv_df["Put_IV"].ewm(span=span, adjust=False).mean()
+    # One ewm pass over both columns instead of one per column
+    iv_df[["Call_IV_EMA", "Put_IV_EMA"]] = iv_df[["Call_IV", "Put_IV"]].ewm(span=span, adjust=False).mean().to_numpy()
     return iv_df
 
 # Main execution
@@ -1,149 +1,189 @@
+import math
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
-from scipy.optimize import brentq, minimize
+from scipy.optimize import minimize, differential_evolution
+from numba import njit, prange
+from options_pricing import black_scholes_price, implied_volatility
 from fetchData import fetchDataIndex, fetchDataOptions
 import matplotlib.pyplot as plt
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-# Black-Scholes price function
-def black_scholes_price(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price."""
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return price
-
-# Inverse Black-Scholes to find IV
-def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
-    """Solve for IV using Brent's method."""
-    def objective(sigma):
-        return black_scholes_price(S, K, T, r, sigma, option_type) - market_price
+# Fetch ATM call IV for a single day
+def _process_day(day, expiry_day, r):
+    """Fetch SPX/SPXW data for one day; returns (day, S, strike, call_iv, T) or None."""
+    print(f"Processing {day}")
+    # Fetch SPX data
+    try:
+        S = fetchDataIndex("SPX", day, day)["Open"].iat[0]
+    except Exception as e:
+        print(f"SPX fetch error on {day}: {e}")
+        return None
+    
+    # ATM strike
+    strike = round(S / 50) * 50
+    T = (pd.to_datetime(expiry_day) - pd.to_datetime(day)).days / 365
+    
+    # Filter: Ensure T is 7-60 days
+    if not (7 <= T * 365 <= 60):
+        print(f"Time to expiry ({T*365:.0f} days) outside [7, 60] for {day}")
+        return None
     
+    # Fetch call data
     try:
-        iv = brentq(objective, 0.01, 2.0, xtol=tol)
-        return iv
-    except ValueError:
-        return np.nan
+        ce_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "CE")
+    except Exception as e:
+        print(f"Option fetch error on {day}, strike {strike}: {e}")
+        return None
+    
+    # Use first minute's open price
+    call_price = ce_df["Open"].iat[0] if not ce_df.empty else np.nan
+    
+    # Filter: Ensure price is positive
+    if np.isnan(call_price) or call_price <= 0:
+        print(f"Invalid call price on {day}, strike {strike}: ${call_price}")
+        return None
+    
+    # Calculate IV
+    call_iv = implied_volatility(S, strike, T, r, call_price, "call")
+    if np.isnan(call_iv):
+        return None
+    return day, S, strike, call_iv, T
 
 # Fetch daily ATM IV
-def fetch_daily_atm_iv(trading_days, expiry_day, r=0.02):
-    """Fetch SPX/SPXW data and calculate daily ATM call IV."""
-    iv_data = []
+def fetch_daily_atm_iv(trading_days, expiry_day, r=0.02, max_workers=10):
+    """Fetch SPX/SPXW data and calculate daily ATM call IV (days are fetched concurrently)."""
+    # Output columns preallocated per day, trimmed to the days with a valid IV
+    n = len(trading_days)
+    day_out = np.empty(n, dtype=object)
+    S_out = np.empty(n)
+    strike_out = np.empty(n, dtype=np.int64)
+    iv_out = np.empty(n)
+    T_out = np.empty(n)
+    i = 0
     
-    for day in trading_days:
-        print(f"Processing {day}")
-        # Fetch SPX data
-        try:
-            spx_df = fetchDataIndex("SPX", day, day).reset_index()
-            S = spx_df.loc[0, "Open"]
-        except Exception as e:
-            print(f"SPX fetch error on {day}: {e}")
-            continue
-        
-        # ATM strike
-        strike = round(S / 50) * 50
-        T = (pd.to_datetime(expiry_day) - pd.to_datetime(day)).days / 365
-        
-        # Filter: Ensure T is 7-60 days
-        if not (7 <= T * 365 <= 60):
-            print(f"Time to expiry ({T*365:.0f} days) outside [7, 60] for {day}")
-            continue
-        
-        # Fetch call data
-        try:
-            ce_df = fetchDataOptions("SPXW", day, day, strike, expiry_day, "CE").reset_index()
-        except Exception as e:
-            print(f"Option fetch error on {day}, strike {strike}: {e}")
-            continue
-        
-        # Use first minute's open price
-        call_price = ce_df.loc[0, "Open"] if not ce_df.empty else np.nan
-        
-        # Filter: Ensure price is positive
-        if np.isnan(call_price) or call_price <= 0:
-            print(f"Invalid call price on {day}, strike {strike}: ${call_price}")
-            continue
-        
-        # Calculate IV
-        call_iv = implied_volatility(S, strike, T, r, call_price, "call")
-        
-        if not np.isnan(call_iv):
-            iv_data.append({
-                "Date": day,
-                "SPX_Open": S,
-                "Strike": strike,
-                "Call_IV": call_iv,
-                "Time_to_Expiry": T
-            })
+    # Days are independent and I/O-bound; map() keeps the results in trading-day order
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        for result in ex.map(lambda d: _process_day(d, expiry_day, r), trading_days):
+            if result is None:
+                continue
+            day_out[i], S_out[i], strike_out[i], iv_out[i], T_out[i] = result
+            i += 1
     
-    return pd.DataFrame(iv_data)
-
-# Heston model Monte Carlo simulation
-def heston_simulation(S0, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths):
-    """Simulate Heston model paths for price and variance."""
-    dt = T / n_steps
-    price_paths = np.zeros((n_paths, n_steps + 1))
-    vol_paths = np.zeros((n_paths, n_steps + 1))
-    price_paths[:, 0] = S0
-    vol_paths[:, 0] = v0
+    if i == 0:
+        return pd.DataFrame()
     
-    # Correlated Brownian motions
-    z1 = np.random.normal(0, 1, (n_paths, n_steps))
-    z2 = rho * z1 + np.sqrt(1 - rho**2) * np.random.normal(0, 1, (n_paths, n_steps))
+    return pd.DataFrame({
+        "Date": day_out[:i],
+        "SPX_Open": S_out[:i],
+        "Strike": strike_out[:i],
+        "Call_IV": iv_out[:i],
+        "Time_to_Expiry": T_out[:i]
+    })
+
+# Heston model Monte Carlo path loop
+@njit(parallel=True, fastmath=True, cache=True)
+def _heston_paths(S0, v0, kappa, theta, sigma_v, rho, r, dt, z1, w):
+    """Step each path through the Heston dynamics from pre-drawn normals (paths run in parallel)."""
+    n_paths, n_steps = z1.shape
+    sqrt_dt = math.sqrt(dt)
+    rho_c = math.sqrt(1 - rho**2)
+    # Paths are stored in the normals' dtype (float32 by default); the per-path state stays float64
+    price_paths = np.empty((n_paths, n_steps + 1), dtype=z1.dtype)
+    vol_paths = np.empty((n_paths, n_steps + 1), dtype=z1.dtype)
     
-    for t in range(n_steps):
-        # Variance process (CIR)
-        vol_paths[:, t+1] = np.maximum(
-            vol_paths[:, t] + kappa * (theta - vol_paths[:, t]) * dt + 
-            sigma_v * np.sqrt(vol_paths[:, t]) * np.sqrt(dt) * z2[:, t], 
-            0
-        )
-        # Price process
-        price_paths[:, t+1] = price_paths[:, t] * np.exp(
-            (r - 0.5 * vol_paths[:, t]) * dt + 
-            np.sqrt(vol_paths[:, t]) * np.sqrt(dt) * z1[:, t]
-        )
+    for i in prange(n_paths):
+        s = S0
+        v = v0
+        price_paths[i, 0] = s
+        vol_paths[i, 0] = v
+        for t in range(n_steps):
+            # Correlated Brownian motions
+            z2 = rho * z1[i, t] + rho_c * w[i, t]
+            # Full truncation: v stays signed, only its positive part enters drift and diffusion
+            v_pos = max(v, 0.0)
+            sqrt_v = math.sqrt(v_pos)
+            # Price process
+            s = s * math.exp((r - 0.5 * v_pos) * dt + sqrt_v * sqrt_dt * z1[i, t])
+            # Variance process (CIR)
+            v = v + kappa * (theta - v_pos) * dt + sigma_v * sqrt_v * sqrt_dt * z2
+            price_paths[i, t + 1] = s
+            vol_paths[i, t + 1] = max(v, 0.0)
     
     return price_paths, vol_paths
 
+# Antithetic normals for the price and variance shocks
+def _antithetic_normals(rng, n_paths, n_steps, dtype=np.float32):
+    """Draw half the paths and mirror them as -z for the other half; returns shape (2, n_paths, n_steps)."""
+    if rng is None:
+        rng = np.random.default_rng()
+    half = (n_paths + 1) // 2
+    # float32 halves the memory traffic; MC error (~1/sqrt(n_paths)) dwarfs the lost precision
+    z = rng.standard_normal((2, half, n_steps), dtype=dtype)
+    return np.concatenate([z, -z], axis=1)[:, :n_paths]
+
+# Heston model Monte Carlo simulation
+def heston_simulation(S0, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths, rng=None):
+    """Simulate Heston model paths for price and variance (antithetic normals)."""
+    z = _antithetic_normals(rng, n_paths, n_steps)
+    return _heston_paths(S0, v0, kappa, theta, sigma_v, rho, r, T / n_steps, z[0], z[1])
+
 # Heston option pricing
-def heston_option_price(S0, K, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths, option_type="call"):
+def heston_option_price(S0, K, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths, option_type="call", rng=None):
     """Price option using Heston model Monte Carlo."""
-    price_paths, _ = heston_simulation(S0, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths)
+    price_paths, _ = heston_simulation(S0, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths, rng)
     if option_type == "call":
         payoffs = np.maximum(price_paths[:, -1] - K, 0)
     else:
         payoffs = np.maximum(K - price_paths[:, -1], 0)
-    return np.exp(-r * T) * np.mean(payoffs)
+    return np.exp(-r * T) * np.mean(payoffs, dtype=np.float64)
+
+# Heston option pricing for several options on common random numbers
+def heston_option_price_batch(S0, K, v0, kappa, theta, sigma_v, rho, r, T, n_steps, n_paths, option_type="call", rng=None):
+    """Price options over arrays S0, K, T with Heston Monte Carlo, reusing one set of normals for every option."""
+    S0, K, T = np.broadcast_arrays(np.asarray(S0, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float))
+    z = _antithetic_normals(rng, n_paths, n_steps)
+    prices = np.empty(S0.shape)
+    for i in np.ndindex(S0.shape):
+        price_paths, _ = _heston_paths(S0[i], v0, kappa, theta, sigma_v, rho, r, T[i] / n_steps, z[0], z[1])
+        if option_type == "call":
+            payoffs = np.maximum(price_paths[:, -1] - K[i], 0)
+        else:
+            payoffs = np.maximum(K[i] - price_paths[:, -1], 0)
+        prices[i] = np.exp(-r * T[i]) * np.mean(payoffs, dtype=np.float64)
+    return prices
+
+# Calibration loss; module level so differential_evolution can pickle it for its worker processes
+def _calibration_objective(params, S_arr, K_arr, T_arr, r, market_prices, n_steps, n_paths, seed):
+    v0, kappa, theta, sigma_v, rho = params
+    # Same seed every call (common random numbers), so the objective is deterministic in params
+    model_prices = heston_option_price_batch(
+        S_arr, K_arr, v0, kappa, theta, sigma_v, rho, r, T_arr, n_steps, n_paths, rng=np.random.default_rng(seed)
+    )
+    return np.sum((model_prices - market_prices)**2)
 
 # Calibrate Heston model
-def calibrate_heston(iv_df, S0, K, T, r, n_steps=100, n_paths=1000):
-    """Calibrate Heston parameters to ATM call IVs."""
-    market_prices = []
-    for _, row in iv_df.iterrows():
-        market_prices.append(
-            black_scholes_price(row["SPX_Open"], row["Strike"], row["Time_to_Expiry"], r, row["Call_IV"])
-        )
-    
-    def objective(params):
-        v0, kappa, theta, sigma_v, rho = params
-        model_prices = [
-            heston_option_price(row["SPX_Open"], row["Strike"], v0, kappa, theta, sigma_v, rho, r, 
-                               row["Time_to_Expiry"], n_steps, n_paths) 
-            for _, row in iv_df.iterrows()
-        ]
-        return np.sum((np.array(model_prices) - np.array(market_prices))**2)
+def calibrate_heston(iv_df, S0, K, T, r, n_steps=100, n_paths=1000, seed=42, method="differential_evolution", workers=-1):
+    """Calibrate Heston parameters to ATM call IVs (differential evolution over workers processes by default)."""
+    S_arr = iv_df["SPX_Open"].to_numpy(dtype=float)
+    K_arr = iv_df["Strike"].to_numpy(dtype=float)
+    T_arr = iv_df["Time_to_Expiry"].to_numpy(dtype=float)
+    market_prices = black_scholes_price(S_arr, K_arr, T_arr, r, iv_df["Call_IV"].to_numpy(dtype=float))
+    args = (S_arr, K_arr, T_arr, r, market_prices, n_steps, n_paths, seed)
     
     # Initial guess: [v0, kappa, theta, sigma_v, rho]
     initial_guess = [0.04, 2.0, 0.04, 0.3, -0.7]
     bounds = [(0.01, 0.1), (0.1, 5.0), (0.01, 0.1), (0.01, 1.0), (-1.0, 1.0)]
     
     try:
-        result = minimize(objective, initial_guess, bounds=bounds, method="SLSQP")
+        if method == "differential_evolution":
+            result = differential_evolution(
+                _calibration_objective, bounds, args=args, x0=initial_guess, seed=seed,
+                maxiter=30, tol=1e-4, polish=True, workers=workers, updating="deferred"
+            )
+        else:
+            # The float32 paths ignore the default ~1e-8 finite-difference step, which leaves a zero gradient
+            result = minimize(_calibration_objective, initial_guess, args=args, bounds=bounds, method=method, options={"eps": 1e-3})
         return result.x
     except Exception as e:
         print(f"Calibration error: {e}")
@@ -193,8 +233,8 @@ if __name__ == "__main__":
             # Prepare output DataFrame
             output_df = pd.DataFrame({
                 "Time_Step": np.arange(n_steps + 1) * T / n_steps * 365,
-                "Mean_Price": np.mean(price_paths, axis=0),
-                "Mean_Volatility": np.sqrt(np.mean(vol_paths, axis=0)) * 100
+                "Mean_Price": np.mean(price_paths, axis=0, dtype=np.float64),
+                "Mean_Volatility": np.sqrt(np.mean(vol_paths, axis=0, dtype=np.float64)) * 100
             })
             
             # Export to Excel
@@ -1,59 +1,60 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
-# Black-Scholes for option pricing
-def black_scholes(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price and delta."""
-    from scipy.stats import norm
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
-    
-    return price, delta
+from options_pricing import black_scholes_vec, delta_only
 
 # Straddle payoff calculation
 def straddle_payoff(S, K, T, r, sigma, strategy="long"):
     """Calculate straddle P/L for long or short."""
-    call_price, call_delta = black_scholes(S, K, T, r, sigma, "call")
-    put_price, put_delta = black_scholes(S, K, T, r, sigma, "put")
+    call_price, put_price, call_delta, put_delta = black_scholes_vec(S, K, T, r, sigma)
+    
+    # Payoff at expiration: call + put intrinsic is |S - K|
+    premium = call_price + put_price
+    S_range = np.linspace(S * 0.8, S * 1.2, 100)  # ±20% price range
+    intrinsic = np.abs(S_range - K)
     
     # Long straddle: Buy call + put
     if strategy == "long":
-        premium = call_price + put_price
-        # Payoff at expiration
-        S_range = np.linspace(S * 0.8, S * 1.2, 100)  # ±20% price range
-        payoff = np.maximum(S_range - K, 0) + np.maximum(K - S_range, 0) - premium
+        payoff = intrinsic - premium
     # Short straddle: Sell call + put
     else:
-        premium = call_price + put_price
-        S_range = np.linspace(S * 0.8, S * 1.2, 100)
-        payoff = premium - (np.maximum(S_range - K, 0) + np.maximum(K - S_range, 0))
+        payoff = premium - intrinsic
     
     return S_range, payoff, call_price, put_price, call_delta, put_delta
 
 # Filters for trade selection
 def apply_straddle_filters(S, K, T, r, sigma):
     """Apply filters: IV > 30%, T in [7, 60] days, delta in [0.4, 0.6]."""
-    _, call_delta = black_scholes(S, K, T, r, sigma, "call")
     days_to_expiry = T * 365
     
+    # Cheap checks first; the delta is only computed for candidates that survive them
     if sigma < 0.3:  # IV < 30%
         return False, "IV too low (<30%)"
     if not (7 <= days_to_expiry <= 60):
         return False, f"Time to expiry ({days_to_expiry:.0f} days) outside [7, 60]"
+    call_delta = delta_only(S, K, T, r, sigma, "call")
     if not (0.4 <= call_delta <= 0.6):
         return False, f"Call delta ({call_delta:.3f}) outside [0.4, 0.6]"
     
     return True, "Filters passed"
 
+# Payoff figure reused across runs; a bare Figure needs no GUI backend and is never registered with pyplot
+_payoff_fig = None
+
+def _payoff_axes(interactive):
+    """Return (fig, ax) cleared for a new payoff plot; interactive runs get a pyplot figure they can show."""
+    global _payoff_fig
+    if interactive:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(10, 6))
+        return fig, fig.add_subplot()
+    if _payoff_fig is None:
+        from matplotlib.figure import Figure
+        _payoff_fig = Figure(figsize=(10, 6))
+    _payoff_fig.clear()
+    return _payoff_fig, _payoff_fig.add_subplot()
+
 # Main function
-def run_straddle(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, strategy="long"):
+def run_straddle(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, strategy="long", plot=True, interactive=False):
     """Run straddle strategy with filters."""
     # Apply filters
     is_valid, message = apply_straddle_filters(S, K, T, r, sigma)
@@ -71,20 +72,27 @@ def run_straddle(S=5300, K=5300, T=30/365, r=0.02, sigma=0.35, strategy="long"):
     print(f"Total Premium: ${call_price + put_price:.2f}")
     
     # Plot payoff
-    plt.figure(figsize=(10, 6))
-    plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Straddle Payoff")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.axvline(S, color='k', linestyle='--', label="Current Price")
-    plt.title(f"{strategy.capitalize()} Straddle Payoff (K=${K}, IV={sigma*100:.1f}%)")
-    plt.xlabel("Stock Price ($)")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{strategy}_straddle_payoff.png")
-    plt.show()
+    if plot:
+        fig, ax = _payoff_axes(interactive)
+        ax.plot(S_range, payoff, label=f"{strategy.capitalize()} Straddle Payoff")
+        ax.axhline(0, color='k', linestyle='--', alpha=0.3)
+        ax.axvline(S, color='k', linestyle='--', label="Current Price")
+        ax.set_title(f"{strategy.capitalize()} Straddle Payoff (K=${K}, IV={sigma*100:.1f}%)")
+        ax.set_xlabel("Stock Price ($)")
+        ax.set_ylabel("Profit/Loss ($)")
+        ax.legend()
+        ax.grid()
+        fig.savefig(f"{strategy}_straddle_payoff.png")
+        if interactive:
+            import matplotlib.pyplot as plt
+            try:
+                if plt.get_backend().lower() != "agg":
+                    plt.show()
+            finally:
+                plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Long straddle
-    run_straddle(strategy="long")
+    run_straddle(strategy="long", interactive=True)
     # Example: Short straddle
-    run_straddle(strategy="short")
\ No newline at end of file
+    run_straddle(strategy="short", interactive=True)
\ No newline at end of file
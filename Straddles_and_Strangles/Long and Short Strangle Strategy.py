@@ -1,60 +1,64 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
-# Black-Scholes for option pricing
-def black_scholes(S, K, T, r, sigma, option_type="call"):
-    """Calculate Black-Scholes option price and delta."""
-    from scipy.stats import norm
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    
-    if option_type == "call":
-        price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        delta = norm.cdf(d1)
-    else:
-        price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        delta = norm.cdf(d1) - 1
-    
-    return price, delta
+from options_pricing import black_scholes_vec, delta_only
 
 # Strangle payoff calculation
 def strangle_payoff(S, K_call, K_put, T, r, sigma, strategy="long"):
     """Calculate strangle P/L for long or short."""
-    call_price, call_delta = black_scholes(S, K_call, T, r, sigma, "call")
-    put_price, put_delta = black_scholes(S, K_put, T, r, sigma, "put")
+    calls, puts, call_deltas, put_deltas = black_scholes_vec(S, [K_call, K_put], T, r, sigma)
+    call_price, call_delta = calls[0], call_deltas[0]
+    put_price, put_delta = puts[1], put_deltas[1]
+    
+    # Payoff at expiration (intrinsic accumulated in place)
+    premium = call_price + put_price
+    S_range = np.linspace(S * 0.8, S * 1.2, 100)  # ±20% price range
+    intrinsic = np.maximum(S_range - K_call, 0)
+    intrinsic += np.maximum(K_put - S_range, 0)
     
     # Long strangle: Buy OTM call + put
     if strategy == "long":
-        premium = call_price + put_price
-        # Payoff at expiration
-        S_range = np.linspace(S * 0.8, S * 1.2, 100)  # ±20% price range
-        payoff = np.maximum(S_range - K_call, 0) + np.maximum(K_put - S_range, 0) - premium
+        payoff = intrinsic - premium
     # Short strangle: Sell OTM call + put
     else:
-        premium = call_price + put_price
-        S_range = np.linspace(S * 0.8, S * 1.2, 100)
-        payoff = premium - (np.maximum(S_range - K_call, 0) + np.maximum(K_put - S_range, 0))
+        payoff = premium - intrinsic
     
     return S_range, payoff, call_price, put_price, call_delta, put_delta
 
 # Filters for trade selection
 def apply_strangle_filters(S, K_call, K_put, T, r, sigma):
     """Apply filters: IV > 25%, T in [7, 60] days, delta in [0.2, 0.4]."""
-    _, call_delta = black_scholes(S, K_call, T, r, sigma, "call")
-    _, put_delta = black_scholes(S, K_put, T, r, sigma, "put")
     days_to_expiry = T * 365
     
+    # Cheap checks first; deltas are only computed for candidates that survive them
     if sigma < 0.25:  # IV < 25%
         return False, "IV too low (<25%)"
     if not (7 <= days_to_expiry <= 60):
         return False, f"Time to expiry ({days_to_expiry:.0f} days) outside [7, 60]"
+    call_delta = delta_only(S, K_call, T, r, sigma, "call")
+    put_delta = delta_only(S, K_put, T, r, sigma, "put")
     if not (0.2 <= call_delta <= 0.4) or not (-0.4 <= put_delta <= -0.2):
         return False, f"Deltas (Call: {call_delta:.3f}, Put: {put_delta:.3f}) outside [0.2, 0.4]"
     
     return True, "Filters passed"
 
+# Payoff figure reused across runs; a bare Figure needs no GUI backend and is never registered with pyplot
+_payoff_fig = None
+
+def _payoff_axes(interactive):
+    """Return (fig, ax) cleared for a new payoff plot; interactive runs get a pyplot figure they can show."""
+    global _payoff_fig
+    if interactive:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(10, 6))
+        return fig, fig.add_subplot()
+    if _payoff_fig is None:
+        from matplotlib.figure import Figure
+        _payoff_fig = Figure(figsize=(10, 6))
+    _payoff_fig.clear()
+    return _payoff_fig, _payoff_fig.add_subplot()
+
 # Main function
-def run_strangle(S=5300, K_call=5400, K_put=5200, T=30/365, r=0.02, sigma=0.35, strategy="long"):
+def run_strangle(S=5300, K_call=5400, K_put=5200, T=30/365, r=0.02, sigma=0.35, strategy="long", plot=True, interactive=False):
     """Run strangle strategy with filters."""
     # Apply filters
     is_valid, message = apply_strangle_filters(S, K_call, K_put, T, r, sigma)
@@ -72,20 +76,27 @@ def run_strangle(S=5300, K_call=5400, K_put=5200, T=30/365, r=0.02, sigma=0.35,
     print(f"Total Premium: ${call_price + put_price:.2f}")
     
     # Plot payoff
-    plt.figure(figsize=(10, 6))
-    plt.plot(S_range, payoff, label=f"{strategy.capitalize()} Strangle Payoff")
-    plt.axhline(0, color='k', linestyle='--', alpha=0.3)
-    plt.axvline(S, color='k', linestyle='--', label="Current Price")
-    plt.title(f"{strategy.capitalize()} Strangle Payoff (K_call=${K_call}, K_put=${K_put}, IV={sigma*100:.1f}%)")
-    plt.xlabel("Stock Price ($)")
-    plt.ylabel("Profit/Loss ($)")
-    plt.legend()
-    plt.grid()
-    plt.savefig(f"{strategy}_strangle_payoff.png")
-    plt.show()
+    if plot:
+        fig, ax = _payoff_axes(interactive)
+        ax.plot(S_range, payoff, label=f"{strategy.capitalize()} Strangle Payoff")
+        ax.axhline(0, color='k', linestyle='--', alpha=0.3)
+        ax.axvline(S, color='k', linestyle='--', label="Current Price")
+        ax.set_title(f"{strategy.capitalize()} Strangle Payoff (K_call=${K_call}, K_put=${K_put}, IV={sigma*100:.1f}%)")
+        ax.set_xlabel("Stock Price ($)")
+        ax.set_ylabel("Profit/Loss ($)")
+        ax.legend()
+        ax.grid()
+        fig.savefig(f"{strategy}_strangle_payoff.png")
+        if interactive:
+            import matplotlib.pyplot as plt
+            try:
+                if plt.get_backend().lower() != "agg":
+                    plt.show()
+            finally:
+                plt.close(fig)
 
 if __name__ == "__main__":
     # Example: Long strangle
-    run_strangle(strategy="long")
+    run_strangle(strategy="long", interactive=True)
     # Example: Short strangle
-    run_strangle(strategy="short")
\ No newline at end of file
+    run_strangle(strategy="short", interactive=True)
\ No newline at end of file
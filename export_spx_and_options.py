@@ -1,101 +1,276 @@
-import datetime
-import pandas as pd
-import time
-import psycopg2
-from fetchData import fetchDataIndex, fetchDataOptions
-
-def get_atm_strike(spx_open, step=50):
-    return round(spx_open / step) * step
-
-def fetch_day_data(trading_day, expiry_day, strike=None):
-    max_retries = 3
-    retry_delay = 5
-
-    # Fetch SPX
-    for attempt in range(max_retries):
-        try:
-            spx_df = fetchDataIndex("SPX", trading_day, trading_day).reset_index()
-            break
-        except Exception as e:
-            print(f"[SPX ERROR on {trading_day}] {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                return None
-
-    # Determine ATM strike if needed
-    if strike is None:
-        strike = get_atm_strike(spx_df.loc[0, "Open"])
-
-    # Fetch CE and PE
-    for attempt in range(max_retries):
-        try:
-            ce_df = fetchDataOptions("SPXW", trading_day, trading_day, strike, expiry_day, "CE").reset_index()
-            pe_df = fetchDataOptions("SPXW", trading_day, trading_day, strike, expiry_day, "PE").reset_index()
-            break
-        except Exception as e:
-            print(f"[OPTION ERROR on {trading_day}] {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                return None
-
-    # Rename columns for clarity
-    spx_df = spx_df.rename(columns=lambda x: f"{x}_spx" if x != 'timestamp' else x)
-    ce_df = ce_df.rename(columns=lambda x: f"{x}_ce" if x != 'timestamp' else x)
-    pe_df = pe_df.rename(columns=lambda x: f"{x}_pe" if x != 'timestamp' else x)
-
-    ce_df["OptionType_ce"] = "CE"
-    pe_df["OptionType_pe"] = "PE"
-    ce_df["Strike_ce"] = strike
-    pe_df["Strike_pe"] = strike
-    ce_df["Expiry_ce"] = expiry_day
-    pe_df["Expiry_pe"] = expiry_day
-
-    # Merge
-    merged = spx_df.merge(ce_df, on="timestamp", how="outer")
-    merged = merged.merge(pe_df, on="timestamp", how="outer")
-    merged["TradingDate"] = trading_day
-    return merged
-
-def export_multi_day_data(trading_days, expiry_day, strike=None, output_file="SPX_Options_MultiDay.xlsx"):
-    all_data = []
-    for day in trading_days:
-        print(f"📅 Fetching data for {day}")
-        day_df = fetch_day_data(day, expiry_day, strike)
-        if day_df is not None:
-            all_data.append(day_df)
-
-    if not all_data:
-        print("⚠️ No data was fetched. Check errors above.")
-        return
-
-    final_df = pd.concat(all_data, ignore_index=True)
-
-    # Export
-    final_df.to_excel(output_file, index=False, sheet_name="SPX_and_Options")
-    print(f"✅ All data exported to {output_file}")
-
-# Example usage
-if __name__ == "__main__":
-    expiry_day = datetime.date(2024, 5, 31)
-
-    # Define the list of trading days you want (10–15)
-    trading_days = [
-        datetime.date(2024, 5, 15),
-        datetime.date(2024, 5, 16),
-        datetime.date(2024, 5, 17),
-        datetime.date(2024, 5, 20),
-        datetime.date(2024, 5, 21),
-        datetime.date(2024, 5, 22),
-        datetime.date(2024, 5, 23),
-        datetime.date(2024, 5, 24),
-        datetime.date(2024, 5, 27),
-        datetime.date(2024, 5, 28),
-        datetime.date(2024, 5, 29),
-        datetime.date(2024, 5, 30),
-        datetime.date(2024, 5, 31),
-    ]
-
-    strike = None  # auto ATM; or set manually e.g. 5250
-    export_multi_day_data(trading_days, expiry_day, strike)
+import collections
+import datetime
+import hashlib
+import itertools
+import os
+import random
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from fetchData import fetchDataIndex, fetchDataOptionsBatch
+
+def get_atm_strike(spx_open, step=50):
+    """ATM strike for one SPX open, or an array of strikes for an array of opens."""
+    strikes = (np.round(np.asarray(spx_open, dtype=float) / step) * step).astype(int)
+    return strikes if strikes.ndim else int(strikes)
+
+# Canonical export schema: every day is cast to it, so a day with a missing leg or minute
+# can't change a column's type (nulls stay typed) and the days concatenate without promotion
+_OHLC = ["Open", "High", "Low", "Close"]
+_LEG_TYPES = [("OptionType", pa.string()), ("Strike", pa.int64()), ("Expiry", pa.timestamp("ns"))] \
+    + [(col, pa.float64()) for col in _OHLC] + [("Volume", pa.int64())]
+EXPORT_SCHEMA = pa.schema(
+    [("timestamp", pa.timestamp("ns"))]
+    + [(f"{col}_spx", pa.float64()) for col in _OHLC]
+    + [(f"{col}_{leg}", typ) for leg in ("ce", "pe") for col, typ in _LEG_TYPES]
+    + [("TradingDate", pa.timestamp("ns"))]
+)
+
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5  # seconds; doubles per attempt up to RETRY_MAX_DELAY, with jitter
+RETRY_MAX_DELAY = 8.0
+# Transient connection/timeout failures are retried; anything else (bad query, missing data) fails at once
+RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, TimeoutError, ConnectionError)
+
+# Caps in-flight queries across the per-day pool and each day's SPX/option fetches
+_fetch_slots = threading.BoundedSemaphore(8)
+
+# On-disk cache of fetched frames, one Parquet file per fetch call
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+def _cache_path(fetch, args):
+    key = hashlib.sha1(repr((fetch.__name__,) + args).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+def _fetch_with_retries(label, trading_day, fetch, *args, force_refresh=False):
+    """Run one fetch with the retry/backoff policy; returns None on a fatal error or once retries are exhausted."""
+    # Only finalized days are cached; today's and yesterday's data can still change
+    cacheable = pd.Timestamp(trading_day).date() < datetime.date.today() - datetime.timedelta(days=1)
+    path = _cache_path(fetch, args)
+    if cacheable and not force_refresh and os.path.exists(path):
+        return pd.read_parquet(path)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            with _fetch_slots:
+                df = fetch(*args)
+            break
+        except RETRYABLE_ERRORS as e:
+            print(f"[{label} ERROR on {trading_day}] {e}")
+            if attempt < MAX_RETRIES - 1:
+                # Exponential backoff; jitter keeps the parallel days from retrying in lockstep
+                time.sleep(min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * (0.5 + random.random()))
+        except Exception as e:
+            print(f"[{label} ERROR on {trading_day}] {e}")
+            return None
+    else:
+        return None
+
+    if cacheable:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"  # Written aside then renamed, so readers never see a partial file
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"[CACHE WARNING] could not cache {label} data for {trading_day}: {e}")
+    return df
+
+def fetch_all_spx(trading_days, force_refresh=False):
+    """Fetch SPX for all trading days with one range query; returns {day: that day's frame}."""
+    first_day, last_day = min(trading_days), max(trading_days)
+    # Keyed on the last day so the range is only cached once every day in it is finalized
+    spx_df = _fetch_with_retries("SPX", last_day, fetchDataIndex, "SPX", first_day, last_day, force_refresh=force_refresh)
+    if spx_df is None:
+        return {}
+    wanted = set(trading_days)
+    return {day: day_df for day, day_df in spx_df.groupby(spx_df.index.date) if day in wanted}
+
+def _fetch_option_legs(symbol, start_day, end_day, strike, expiry_day):
+    """CE and PE for one strike/expiry in a single query; raises if a leg is missing so the day is dropped."""
+    legs = fetchDataOptionsBatch(symbol, start_day, end_day, [strike], [expiry_day])
+    missing = {"CE", "PE"} - set(legs["OptionType"])
+    if missing:
+        raise Exception(f"Options data Not found - {start_day}__{strike}__{expiry_day}__{'/'.join(sorted(missing))}")
+    return legs
+
+def fetch_all_option_legs(trading_days, strike, expiry_day, force_refresh=False):
+    """Fetch CE and PE for one strike across all trading days with one range query; returns {day: that day's legs}."""
+    first_day, last_day = min(trading_days), max(trading_days)
+    legs = _fetch_with_retries("OPTION", last_day, _fetch_option_legs, "SPXW", first_day, last_day, strike, expiry_day,
+                               force_refresh=force_refresh)
+    if legs is None:
+        return {}
+    wanted = set(trading_days)
+    # A day missing either leg is left out, so it goes through the per-day fetch and its error handling
+    return {day: day_legs for day, day_legs in legs.groupby(legs.index.date)
+            if day in wanted and day_legs["OptionType"].nunique() == 2}
+
+def fetch_day_data(trading_day, expiry_day, strike=None, force_refresh=False, spx_df=None, legs=None):
+    # Caller-supplied SPX frame / legs (see fetch_all_spx and fetch_all_option_legs) skip those queries entirely
+    def _fetch_spx():
+        return _fetch_with_retries("SPX", trading_day, fetchDataIndex, "SPX", trading_day, trading_day, force_refresh=force_refresh)
+
+    def _fetch_legs(strike):
+        return _fetch_with_retries("OPTION", trading_day, _fetch_option_legs,
+                                   "SPXW", trading_day, trading_day, strike, expiry_day, force_refresh=force_refresh)
+
+    if spx_df is None and legs is None and strike is not None:
+        # With a fixed strike the option fetch doesn't wait on SPX: run SPX on a helper thread alongside it
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            spx_future = ex.submit(_fetch_spx)
+            legs = _fetch_legs(strike)
+            spx_df = spx_future.result()
+    else:
+        # At most one query is left (or SPX must set the ATM strike first), so no pool is needed
+        if spx_df is None:
+            spx_df = _fetch_spx()
+            if spx_df is None:
+                return None
+        if strike is None:
+            strike = get_atm_strike(spx_df["Open"].iat[0])
+        if legs is None:
+            legs = _fetch_legs(strike)
+
+    if spx_df is None or legs is None:
+        return None
+    ce_df = legs[legs["OptionType"] == "CE"]
+    pe_df = legs[legs["OptionType"] == "PE"]
+
+    # Rename columns for clarity (frames stay indexed by timestamp)
+    spx_df = spx_df.add_suffix("_spx")
+    ce_df = ce_df.add_suffix("_ce")
+    pe_df = pe_df.add_suffix("_pe")
+
+    ce_df["OptionType_ce"] = "CE"
+    pe_df["OptionType_pe"] = "PE"
+    ce_df["Strike_ce"] = strike
+    pe_df["Strike_pe"] = strike
+    ce_df["Expiry_ce"] = expiry_day
+    pe_df["Expiry_pe"] = expiry_day
+
+    # Merge: one outer alignment of all three frames on their timestamp index. That alignment raises on
+    # a repeated timestamp, so a duplicated minute keeps its first bar instead of failing the whole day
+    frames = [df[~df.index.duplicated()] for df in (spx_df, ce_df, pe_df)]
+    merged = pd.concat(frames, axis=1, join="outer").rename_axis("timestamp").reset_index()
+    merged["TradingDate"] = trading_day
+    return merged.reindex(columns=EXPORT_SCHEMA.names)
+
+def _bounded_map(ex, fn, items, window):
+    """In-order results like ex.map, but with at most `window` calls submitted ahead of the consumer."""
+    items = iter(items)
+    pending = collections.deque(ex.submit(fn, item) for item in itertools.islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        # Refill before handing the result over, so the workers stay busy while it is written
+        pending.extend(ex.submit(fn, item) for item in itertools.islice(items, 1))
+        yield result
+
+def _write_tables(tables, suffix, output_file):
+    """Write EXPORT_SCHEMA tables to output_file as they arrive; returns the number written."""
+    tables = iter(tables)
+    first = next(tables, None)
+    if first is None:  # Nothing fetched: leave no empty file behind
+        return 0
+    count = 0
+    if suffix == ".parquet":
+        with pq.ParquetWriter(output_file, EXPORT_SCHEMA, compression="zstd") as writer:
+            for table in itertools.chain([first], tables):
+                writer.write_table(table)
+                count += 1
+    elif suffix == ".feather":
+        # Feather v2 is the Arrow IPC file format; lz4 matches write_feather's default
+        options = pa.ipc.IpcWriteOptions(compression="lz4")
+        with pa.ipc.new_file(output_file, EXPORT_SCHEMA, options=options) as writer:
+            for table in itertools.chain([first], tables):
+                writer.write_table(table)
+                count += 1
+    else:
+        # No constant_memory: pandas writes cell by cell column-wise, which that mode silently drops
+        with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
+            startrow = 0
+            for table in itertools.chain([first], tables):
+                day_df = table.to_pandas()
+                day_df.to_excel(writer, index=False, sheet_name="SPX_and_Options", startrow=startrow, header=not count)
+                startrow += len(day_df) + (not count)
+                count += 1
+    return count
+
+def export_multi_day_data(trading_days, expiry_day, strike=None, output_file="SPX_Options_MultiDay.parquet", max_workers=8, force_refresh=False):
+    # Output format comes from the suffix; checked before any fetching starts
+    suffix = os.path.splitext(output_file)[1].lower()
+    if suffix not in (".parquet", ".feather", ".xlsx"):
+        raise ValueError(f"Unsupported output format: {output_file} (use .parquet, .feather or .xlsx)")
+
+    date_cols = ["TradingDate", "Expiry_ce", "Expiry_pe"]
+
+    if not trading_days:
+        print("⚠️ No data was fetched. Check errors above.")
+        return
+
+    # One SPX range query for every day, and all ATM strikes in one vector op;
+    # days missing from it fall back to fetching SPX on their own
+    spx_by_day = fetch_all_spx(trading_days, force_refresh)
+    day_strikes = dict.fromkeys(trading_days, strike)
+    if strike is None and spx_by_day:
+        opens = np.array([day_df["Open"].iat[0] for day_df in spx_by_day.values()])
+        day_strikes.update(zip(spx_by_day, get_atm_strike(opens).tolist()))
+
+    # When every day uses the same strike, the option legs also come from one range query;
+    # with strikes varying per day (or a day missing from it) the legs are fetched per day
+    legs_by_day = {}
+    strikes = set(day_strikes.values())
+    if len(strikes) == 1 and None not in strikes:
+        legs_by_day = fetch_all_option_legs(trading_days, strikes.pop(), expiry_day, force_refresh)
+
+    def _one(day):
+        print(f"📅 Fetching data for {day}")
+        day_df = fetch_day_data(day, expiry_day, day_strikes[day], force_refresh, spx_by_day.get(day), legs_by_day.get(day))
+        if day_df is None:
+            return None
+        # Date columns hold datetime.date objects; convert them once here instead of per cell at write time
+        day_df[date_cols] = day_df[date_cols].apply(pd.to_datetime).astype("datetime64[ns]")
+        # Hand each day to Arrow right away so frames don't pile up for a pandas concat
+        return pa.Table.from_pandas(day_df, schema=EXPORT_SCHEMA, preserve_index=False)
+
+    # Days are independent and I/O-bound; fetchData pools its connections. Days are written in order as
+    # they come back, and a new day is only submitted once one is consumed, so at most `workers` fetched
+    # tables wait on the writer whatever its speed (Parquet by default; Excel is much slower)
+    workers = max(1, min(max_workers, len(trading_days)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        tables = _bounded_map(ex, _one, trading_days, workers)
+        written = _write_tables((table for table in tables if table is not None), suffix, output_file)
+
+    if not written:
+        print("⚠️ No data was fetched. Check errors above.")
+        return
+    print(f"✅ All data exported to {output_file}")
+
+# Example usage
+if __name__ == "__main__":
+    expiry_day = datetime.date(2024, 5, 31)
+
+    # Define the list of trading days you want (10–15)
+    trading_days = [
+        datetime.date(2024, 5, 15),
+        datetime.date(2024, 5, 16),
+        datetime.date(2024, 5, 17),
+        datetime.date(2024, 5, 20),
+        datetime.date(2024, 5, 21),
+        datetime.date(2024, 5, 22),
+        datetime.date(2024, 5, 23),
+        datetime.date(2024, 5, 24),
+        datetime.date(2024, 5, 27),
+        datetime.date(2024, 5, 28),
+        datetime.date(2024, 5, 29),
+        datetime.date(2024, 5, 30),
+        datetime.date(2024, 5, 31),
+    ]
+
+    strike = None  # auto ATM; or set manually e.g. 5250
+    export_multi_day_data(trading_days, expiry_day, strike)
@@ -2,8 +2,10 @@ import sys
 import os
 import pandas as pd
 import datetime
+import threading
 import psycopg2
 import psycopg2.extras as psycopg2_e
+import psycopg2.pool
 
 parent_dir = os.path.join(os.path.dirname(__file__), '../')
 normalized_path = os.path.normpath(parent_dir)
@@ -13,8 +15,57 @@ sys.path.append(config_dir)
 
 from configReader import ConfigReader 
 config_reader = ConfigReader('config.ini')
-conn = psycopg2.connect(config_reader.get_db_params())
-cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
+
+# Connections are shared through a thread-safe pool (borrowed per query) instead of one per thread.
+# getconn() raises once MAX_CONNECTIONS are out, so the semaphore makes extra callers wait instead.
+MIN_CONNECTIONS = 2
+MAX_CONNECTIONS = 16
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = psycopg2.pool.ThreadedConnectionPool(MIN_CONNECTIONS, MAX_CONNECTIONS, config_reader.get_db_params())
+    return _pool
+
+def _run(conn, query_):
+    with conn.cursor(cursor_factory=psycopg2_e.RealDictCursor) as cursor:
+        cursor.execute(query_)
+        return cursor.fetchall()
+
+def _execute(query_):
+    """
+    Run a query on a pooled connection, retrying once on a fresh connection if the connection fails.
+
+    Parameters
+    ----------
+    query_:str
+
+    Returns
+    -------
+    list of rows (RealDictRow)
+    """
+    pool = _get_pool()
+    with _pool_slots:
+        for attempt in range(2):
+            conn = pool.getconn()
+            try:
+                rows = _run(conn, query_)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # The connection may be broken: never hand it back out, and retry once on a new one
+                pool.putconn(conn, close=True)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                pool.putconn(conn)  # Query errors leave the connection usable; the pool rolls back the aborted transaction
+                raise
+            pool.putconn(conn)  # The pool rolls back the open read transaction
+            return rows
 
 def fetchTradingDays():
     """
@@ -28,26 +79,11 @@ def fetchTradingDays():
     -------
     pd.Dataframe 
     """
-    global ip
-    global conn
-    global cursor
     query_ = f"""
                 SELECT DISTINCT DATE_TRUNC('day', Datetime) AS dates
                 FROM spx_index 
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     df['dates'] = pd.to_datetime(df['dates']).dt.date
     return df
 
@@ -63,9 +99,6 @@ def fetchExpiryDays(symbol:str):
     -------
     pd.Dataframe 
     """
-    global ip
-    global conn
-    global cursor
     
     if(symbol not in ['SPXW']):
         raise Exception('Invalid symbol')
@@ -74,19 +107,7 @@ def fetchExpiryDays(symbol:str):
                 FROM spxw_options_ohlcv
                 ORDER BY Expiry ASC;
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     df['dates'] = pd.to_datetime(df['Expiry'], format='%Y-%m-%d').dt.date
     df = df.sort_values(by='dates')
     df = df[['dates']]
@@ -107,9 +128,6 @@ def fetchDataIndex(symbol:str,startDate:datetime.date,endDate:datetime.date):
     -------
     pd.Dataframe 
     """
-    global ip
-    global conn
-    global cursor
     
     if(symbol not in ['SPX']):
         raise Exception('Invalid symbol')
@@ -127,19 +145,7 @@ def fetchDataIndex(symbol:str,startDate:datetime.date,endDate:datetime.date):
     query_ = f"""
             SELECT Datetime as timestamp, Open, High, Low, Close from {symbol}_index WHERE Datetime >= '{startDate}' AND Datetime <= '{endDate}' ORDER BY Datetime
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     if(df.empty or len(df) == 0):
         raise Exception(f"Index data not found - {startDate}__{endDate}__{symbol}")
     
@@ -164,9 +170,6 @@ def fetchDataOptions(symbol:str,startDate:datetime.date,endDate:datetime.date,st
     -------
     pd.Dataframe 
     """
-    global ip
-    global conn
-    global cursor
     print('Fetching Option Data for:', symbol , 'from:', startDate, 'to:', endDate, 'for expiry:', expiryDate)
     if(symbol not in ['SPXW']):
         raise Exception('Invalid symbol')
@@ -187,19 +190,7 @@ def fetchDataOptions(symbol:str,startDate:datetime.date,endDate:datetime.date,st
             meta_query  as (select  Datetime as timestamp,OptionType,Strike,Expiry,Open,High,Low,Close,Volume,Datetime from 'spxw_options_ohlcv' where Datetime > '{startDate}' and Datetime < '{endDate}')
             SELECT min(timestamp) as timestamp, OptionType,Strike,Expiry,first(Open) as Open, max(High) as High, min(Low) as Low, last(Close) as Close, sum(Volume) as Volume from meta_query where timestamp IN '2000-01-01T09:15;404m;1d;10000' and  (Strike = {strike}) and (Expiry = '{expiryDate}') and (OptionType='{callPut}') SAMPLE BY 1m; 
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     if(df.empty or len(df) == 0):
         raise Exception(f"\nOptions data Not found - {startDate}__{endDate}__{strike}__{expiryDate}__{callPut}")
     else:
@@ -209,36 +200,115 @@ def fetchDataOptions(symbol:str,startDate:datetime.date,endDate:datetime.date,st
         df.index = df.index.round('s')
     return df
 
-def fetchContractMonthFutures(symbol:str):
-    global ip
-    global conn
-    global cursor
+def fetchDataOptionsChain(symbol:str,startDate:datetime.date,endDate:datetime.date,strikes:list,expiryDate,callPut):
+    """
+    Get the Options data for several strikes of one expiry/callPut in a single query.
     
+    Parameters
+    ----------
+    symbol:str - SPXW
+    startDate :datetime.date       
+    endDate: datetime.date    
+    strikes: list of strikes
+    expiryDate: datetime.date
+    callPut: CE or PE
+
+    Returns
+    -------
+    pd.Dataframe (one row per strike per minute, with a Strike column)
+    """
+    print('Fetching Option Chain for:', symbol , 'from:', startDate, 'to:', endDate, 'for expiry:', expiryDate)
+    if(symbol not in ['SPXW']):
+        raise Exception('Invalid symbol')
+
+    if isinstance(startDate, datetime.date):
+        startDate = startDate.strftime('%Y-%m-%d')
+    if isinstance(endDate, datetime.date):
+        endDate = endDate.strftime('%Y-%m-%d')
+    if isinstance(expiryDate, datetime.date):
+        expiryDate = expiryDate.strftime('%Y-%m-%d')
+
+    endDate = datetime.datetime.strptime(endDate, '%Y-%m-%d')
+    endDate = endDate + datetime.timedelta(days=1)
+    endDate = endDate.strftime('%Y-%m-%d')
+
+    strikes_ = ', '.join(str(strike) for strike in strikes)
+    query_ = f"""
+            with 
+            meta_query  as (select  Datetime as timestamp,OptionType,Strike,Expiry,Open,High,Low,Close,Volume,Datetime from 'spxw_options_ohlcv' where Datetime > '{startDate}' and Datetime < '{endDate}')
+            SELECT min(timestamp) as timestamp, OptionType,Strike,Expiry,first(Open) as Open, max(High) as High, min(Low) as Low, last(Close) as Close, sum(Volume) as Volume from meta_query where timestamp IN '2000-01-01T09:15;404m;1d;10000' and  (Strike IN ({strikes_})) and (Expiry = '{expiryDate}') and (OptionType='{callPut}') SAMPLE BY 1m; 
+            """
+    df = pd.DataFrame(_execute(query_))
+    if(df.empty or len(df) == 0):
+        raise Exception(f"\nOptions chain Not found - {startDate}__{endDate}__{strikes_}__{expiryDate}__{callPut}")
+    else:
+        df.timestamp = pd.to_datetime(df.timestamp, format="%Y-%m-%d %H:%M:%S")
+        df = df.set_index("timestamp").sort_index(kind="stable")
+        df = df.between_time('09:30', '15:59')
+        df.index = df.index.round('s')
+    return df
+
+def fetchDataOptionsBatch(symbol:str,startDate:datetime.date,endDate:datetime.date,strikes:list,expiryDates:list,callPuts=("CE", "PE")):
+    """
+    Get the Options data for several strikes, expiries and callPuts in a single query.
+    
+    Parameters
+    ----------
+    symbol:str - SPXW
+    startDate :datetime.date       
+    endDate: datetime.date    
+    strikes: list of strikes
+    expiryDates: list of datetime.date
+    callPuts: CE and/or PE
+
+    Returns
+    -------
+    pd.Dataframe (one row per strike/expiry/callPut per minute; Expiry as pd.Timestamp,
+    so quotes can be looked up with groupby(["Strike", "Expiry", "OptionType"]))
+    """
+    print('Fetching Option Batch for:', symbol , 'from:', startDate, 'to:', endDate, 'for expiries:', expiryDates)
+    if(symbol not in ['SPXW']):
+        raise Exception('Invalid symbol')
+
+    if isinstance(startDate, datetime.date):
+        startDate = startDate.strftime('%Y-%m-%d')
+    if isinstance(endDate, datetime.date):
+        endDate = endDate.strftime('%Y-%m-%d')
+    expiryDates = [expiryDate.strftime('%Y-%m-%d') if isinstance(expiryDate, datetime.date) else expiryDate for expiryDate in expiryDates]
+
+    endDate = datetime.datetime.strptime(endDate, '%Y-%m-%d')
+    endDate = endDate + datetime.timedelta(days=1)
+    endDate = endDate.strftime('%Y-%m-%d')
+
+    strikes_ = ', '.join(str(strike) for strike in strikes)
+    expiries_ = ', '.join(f"'{expiryDate}'" for expiryDate in expiryDates)
+    callPuts_ = ', '.join(f"'{callPut}'" for callPut in callPuts)
+    query_ = f"""
+            with 
+            meta_query  as (select  Datetime as timestamp,OptionType,Strike,Expiry,Open,High,Low,Close,Volume,Datetime from 'spxw_options_ohlcv' where Datetime > '{startDate}' and Datetime < '{endDate}')
+            SELECT min(timestamp) as timestamp, OptionType,Strike,Expiry,first(Open) as Open, max(High) as High, min(Low) as Low, last(Close) as Close, sum(Volume) as Volume from meta_query where timestamp IN '2000-01-01T09:15;404m;1d;10000' and  (Strike IN ({strikes_})) and (Expiry IN ({expiries_})) and (OptionType IN ({callPuts_})) SAMPLE BY 1m; 
+            """
+    df = pd.DataFrame(_execute(query_))
+    if(df.empty or len(df) == 0):
+        raise Exception(f"\nOptions batch Not found - {startDate}__{endDate}__{strikes_}__{expiries_}__{callPuts_}")
+    else:
+        df.timestamp = pd.to_datetime(df.timestamp, format="%Y-%m-%d %H:%M:%S")
+        df.Expiry = pd.to_datetime(df.Expiry).dt.normalize()
+        df = df.set_index("timestamp").sort_index(kind="stable")
+        df = df.between_time('09:30', '15:59')
+        df.index = df.index.round('s')
+    return df
+
+def fetchContractMonthFutures(symbol:str):
     query_ = f"""
              SELECT DISTINCT Contract_month
                 FROM {symbol}_futures
                 ORDER BY Contract_month ASC;
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     return df
 
 def fetchDataFutures(symbol:str,startDate:datetime.date,endDate:datetime.date, contractMonth):
-    global ip
-    global conn
-    global cursor
-  
     if isinstance(startDate, datetime.date):
         startDate = startDate.strftime('%Y-%m-%d')
     
@@ -252,19 +322,7 @@ def fetchDataFutures(symbol:str,startDate:datetime.date,endDate:datetime.date, c
     query_ = f"""
             SELECT Datetime as timestamp, Open, High, Low, Close, Volume from {symbol}_futures WHERE Datetime >= '{startDate}' AND Datetime <= '{endDate}' AND Contract_month='{contractMonth}' ORDER BY Datetime
             """
-    try:
-        cursor.execute(query_)
-    except Exception as e:
-        try:
-            cursor.close()
-        except:
-            conn.close()
-            conn = psycopg2.connect(config_reader.get_db_params())
-                    
-        cursor = conn.cursor(cursor_factory=psycopg2_e.RealDictCursor)
-        cursor.execute(query_)
-
-    df = pd.DataFrame(cursor.fetchall())
+    df = pd.DataFrame(_execute(query_))
     if(df.empty or len(df) == 0):
         raise Exception(f"Futures data not found - {startDate}__{endDate}__{symbol}")
     
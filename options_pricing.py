@@ -0,0 +1,163 @@
+# Black-Scholes pricing and implied-volatility solvers shared by the strategy and IV scripts
+import math
+import numpy as np
+from scipy.special import ndtr
+from scipy.optimize import brentq
+
+INV_SQRT_2PI = 1.0 / math.sqrt(2 * math.pi)  # Standard normal PDF at 0
+
+# Black-Scholes call/put prices, elementwise over broadcast arrays
+def bs_call_vec(S, K, T, r, sigma):
+    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+    return S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
+
+def bs_put_vec(S, K, T, r, sigma):
+    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+    return K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
+
+# Black-Scholes price function
+def black_scholes_price(S, K, T, r, sigma, option_type="call"):
+    """Calculate Black-Scholes option price; option_type is "call"/"put" or a boolean is_call array."""
+    if isinstance(option_type, str):
+        return bs_call_vec(S, K, T, r, sigma) if option_type == "call" else bs_put_vec(S, K, T, r, sigma)
+    return np.where(option_type, bs_call_vec(S, K, T, r, sigma), bs_put_vec(S, K, T, r, sigma))
+
+# Inverse Black-Scholes to find IV
+def implied_volatility(S, K, T, r, market_price, option_type="call", tol=1e-6):
+    """Solve for IV using Brent's method."""
+    sqrt_T = math.sqrt(T)
+    disc = math.exp(-r * T)
+    log_SK = math.log(S / K)
+    is_call = option_type == "call"
+    
+    def objective(sigma):
+        v = sigma * sqrt_T
+        d1 = (log_SK + (r + 0.5 * sigma * sigma) * T) / v
+        d2 = d1 - v
+        if is_call:
+            return S * ndtr(d1) - K * disc * ndtr(d2) - market_price
+        return K * disc * ndtr(-d2) - S * ndtr(-d1) - market_price
+    
+    try:
+        # Bound IV between 1% and 200%
+        iv = brentq(objective, 0.01, 2.0, xtol=tol)
+        return iv
+    except ValueError:
+        return np.nan  # Return NaN if no solution found
+
+# Corrado-Miller closed-form IV approximation (Newton seed)
+def _corrado_miller_seed(S, K, T, r, market_price, is_call):
+    X = K * np.exp(-r * T)
+    C = np.where(is_call, market_price, market_price + S - X)  # Puts mapped to calls via put-call parity
+    q = C - 0.5 * (S - X)
+    root = np.sqrt(np.maximum(q * q - (S - X) ** 2 / np.pi, 0.0))
+    return np.sqrt(2 * np.pi / T) / (S + X) * (q + root)
+
+# Chandrupatla's bracketed root finder on [0.01, 2.0], run over all options at once
+def _chandrupatla_iv(S, K, T, r, market_price, is_call, tol=1e-6, max_iter=50):
+    """Bracketed IV solve for broadcast arrays; NaN where no root is bracketed."""
+    sqrt_T = np.sqrt(T)
+    disc = np.exp(-r * T)
+    log_SK = np.log(S / K)
+    
+    def objective(sigma):
+        v = sigma * sqrt_T
+        d1 = (log_SK + (r + 0.5 * sigma * sigma) * T) / v
+        d2 = d1 - v
+        price = np.where(is_call, S * ndtr(d1) - K * disc * ndtr(d2), K * disc * ndtr(-d2) - S * ndtr(-d1))
+        return price - market_price
+    
+    # x1 is the newest point, x2 brackets the root with it, x3 is the previous point
+    x1 = np.full(S.shape, 2.0)
+    x2 = np.full(S.shape, 0.01)
+    f1 = objective(x1)
+    f2 = objective(x2)
+    x3, f3 = x2, f2
+    valid = np.isfinite(market_price) & (market_price > 0) & (np.sign(f1) != np.sign(f2))
+    active = valid & (f1 != 0) & (f2 != 0)
+    t = np.full(S.shape, 0.5)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            xt = x1 + t * (x2 - x1)
+            ft = objective(xt)
+            
+            # Keep the root bracketed between x1 and x2
+            same = (np.sign(ft) == np.sign(f1)) & active
+            flip = ~same & active
+            x3 = np.where(same, x1, np.where(flip, x2, x3))
+            f3 = np.where(same, f1, np.where(flip, f2, f3))
+            x2 = np.where(flip, x1, x2)
+            f2 = np.where(flip, f1, f2)
+            x1 = np.where(active, xt, x1)
+            f1 = np.where(active, ft, f1)
+            
+            # Converged once the bracket is below tol (or the root is hit exactly)
+            tlim = tol / np.abs(x2 - x1)
+            active &= (tlim <= 0.5) & (f1 != 0)
+            
+            # Inverse quadratic interpolation when it is safe, otherwise bisect
+            xi = (x1 - x2) / (x3 - x2)
+            phi = (f1 - f2) / (f3 - f2)
+            iqi = (1 - np.sqrt(1 - xi) < phi) & (phi < np.sqrt(xi))
+            t_iqi = f1 / (f2 - f1) * f3 / (f2 - f3) + (x3 - x1) / (x2 - x1) * f1 / (f3 - f1) * f2 / (f3 - f2)
+            t = np.clip(np.where(iqi, t_iqi, 0.5), tlim, 1 - tlim)
+    
+    return np.where(valid, np.where(np.abs(f1) < np.abs(f2), x1, x2), np.nan)
+
+# Vectorized inverse Black-Scholes (Newton steps with a bracketed fallback)
+def implied_volatility_vec(S, K, T, r, market_price, is_call=True, tol=1e-6, max_iter=8):
+    """Solve for IV over arrays of options using Newton's method from a Corrado-Miller seed, falling back to Chandrupatla's method."""
+    S, K, T, market_price, is_call = np.broadcast_arrays(
+        np.asarray(S, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float),
+        np.asarray(market_price, dtype=float), np.asarray(is_call, dtype=bool)
+    )
+    sqrt_T = np.sqrt(T)
+    disc = np.exp(-r * T)
+    log_SK = np.log(S / K)
+    
+    converged = np.zeros(S.shape, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.clip(_corrado_miller_seed(S, K, T, r, market_price, is_call), 0.01, 2.0)
+        for _ in range(max_iter):
+            v = sigma * sqrt_T
+            d1 = (log_SK + (r + 0.5 * sigma * sigma) * T) / v
+            d2 = d1 - v
+            price = np.where(is_call, S * ndtr(d1) - K * disc * ndtr(d2), K * disc * ndtr(-d2) - S * ndtr(-d1))
+            vega = S * INV_SQRT_2PI * np.exp(-0.5 * d1 * d1) * sqrt_T
+            step = (price - market_price) / vega
+            sigma = np.clip(sigma - step, 0.01, 2.0)
+            converged = np.abs(step) < tol
+            if converged.all():
+                break
+    
+    # Bracketed solve only for options Newton could not settle
+    valid = np.isfinite(market_price) & (market_price > 0)
+    sigma = np.where(valid & converged, sigma, np.nan)
+    rest = valid & ~converged
+    if rest.any():
+        sigma[rest] = _chandrupatla_iv(S[rest], K[rest], T[rest], r, market_price[rest], is_call[rest], tol)
+    return sigma
+
+# Vectorized Black-Scholes over an array of strikes (T-dependent terms shared across K)
+def black_scholes_vec(S, K, T, r, sigma):
+    """Return (call_price, put_price, call_delta, put_delta) arrays for strikes K."""
+    K = np.asarray(K, dtype=float)
+    sqrt_T = np.sqrt(T)
+    disc = np.exp(-r * T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    call_delta = ndtr(d1)
+    call = S * call_delta - K * disc * ndtr(d2)
+    put = K * disc * ndtr(-d2) - S * ndtr(-d1)
+    return call, put, call_delta, call_delta - 1
+
+# Delta only (skips the price terms) for the trade filters; scalar math avoids NumPy call overhead
+def delta_only(S: float, K: float, T: float, r: float, sigma: float, option_type: str = "call") -> float:
+    d1 = (math.log(S / K) + (r + 0.5 * sigma * sigma) * T) / (sigma * math.sqrt(T))
+    Nd1 = 0.5 * math.erfc(-d1 * 0.7071067811865476)
+    return Nd1 if option_type == "call" else Nd1 - 1.0